@@ -0,0 +1,210 @@
+"""
+call-home METRICS-DUMP benchmark, compares the slog parser and metrics series with the get_slog_metrics they replaced.
+
+Writes a synthetic slog (METRICS-DUMP lines among the usual INFO/ERROR/AUDIT lines), buckets its metrics with both the
+original get_slog_metrics (copied below as it was) and SlogMetrics, fails if their results differ and reports the
+throughput of each:
+
+    python benchmarks/slog_parser.py [--size-mb 2048] [--metrics-every 20] [--slog /tmp/server.log]
+"""
+import sys
+import json
+import datetime
+import collections
+from os import path
+from random import Random
+from json import dumps
+from time import perf_counter
+from re import findall as re_findall
+from tempfile import TemporaryDirectory
+from argparse import ArgumentParser
+from typing import Callable, Dict, Iterable, Iterator
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from varada_trino_manager.infra.metrics_store import MetricsSeries  # noqa: E402
+from varada_trino_manager.infra.slog_parser import SlogMetrics, resolution_minutes  # noqa: E402
+
+GROUPS = {
+    "dictionary": ["dictionaries_size", "dictionary_read_elements_count", "dictionary_entries",
+                   "dictionaries_varlen_str_size", "dictionary_loaded_elements_count"],
+    "dispatcherPageSource": ["varada_collect_columns", "cached_total_rows", "cached_files", "prefilled_collect_columns",
+                             "prefilled_collect_bytes", "varada_match_columns", "cached_varada_success_files",
+                             "cached_read_rows"],
+    "warmup-exporter": ["export_disabled", "warm_scheduled", "warm_finished", "warm_failed"],
+    "worker-task-executor": ["task_scheduled", "task_finished", "task_resubmitted", "task_pending"],
+}
+CATALOGS = ["varada", "hive"]
+DELTA_METRICS = "cached_total_rows,cached_read_rows,dictionary_entries,task_pending"
+GRANULARITY_MINUTES = 5
+CHUNK_SIZE = 64 * 1024 * 1024
+OTHER_LINES = [
+    "INFO\tdispatcher-query-42\tio.trino.event.QueryMonitor\tTIMELINE: Query 20220208_071635_00042_abcde :: FINISHED",
+    "ERROR\tremote-task-callback-7\tio.trino.execution.StageStateMachine\tStage 20220208_071635_00042_abcde.1 failed",
+    "INFO\tquery-execution-3\tio.varada.audit\tAUDIT user analyst ran select count(*) from orders",
+]
+
+
+def generate(slog: str, size_mb: int, metrics_every: int, seed: int = 1) -> None:
+    random = Random(seed)
+    timestamp_ms = 1644304595437
+    size, lines = 0, 0
+    with open(slog, "w") as f:
+        while size < size_mb * 1024 * 1024:
+            iso = f"2022-02-08T07:16:35.{timestamp_ms % 1000:03d}Z"
+            if lines % metrics_every == 0:
+                stats = {f"{group}.{catalog}": {metric: f"{random.choice('+-')}{random.randint(0, 99)} "
+                                                        f"({random.randint(0, 10 ** 9)})" for metric in metrics}
+                         for group, metrics in GROUPS.items() for catalog in CATALOGS}
+                payload = dumps({"stats": stats, "catalog": random.choice(CATALOGS), "worker-nodes": 1,
+                                 "timestamp": timestamp_ms}, separators=(",", ":"))
+                line = f"{iso}\tINFO\tTimer-1\tMETRICS-DUMP\t{payload}\n"
+            else:
+                line = f"{iso}\t{OTHER_LINES[lines % len(OTHER_LINES)]}\n"
+            f.write(line)
+            size += len(line)
+            lines += 1
+            timestamp_ms += 1000
+
+
+def baseline_get_slog_metrics(slog_files: list, frequency_minutes: int, start_time, end_time, delta_metrics):
+    """
+    The METRICS-DUMP parsing and bucketing call_home_methods.get_slog_metrics did before the slog parser, verbatim
+    """
+    catalog_ts_jsons = collections.defaultdict(lambda: collections.defaultdict(dict))
+    for slog in slog_files:
+        for line in slog.split('\n'):
+            if "METRICS-DUMP" in line:
+                line_splits = re_findall(r'([\S]+)[\s]+INFO.*METRICS-DUMP[\s]+(.*)', line)  # re_findall returns array of strings, we need the line with stat in the second string
+                json_stats = get_stats(line_splits)
+                if json_stats:
+                    json_data = json.loads(json_stats)
+                    timestamp = json_data.get('timestamp', get_timestamp(line_splits))
+                    if not timestamp:
+                        continue
+                    timestamp /= 1000  # seconds
+                    timestamp_str = datetime.datetime.fromtimestamp(timestamp).strftime('%m/%d/%Y %H:%M')
+
+                    if timestamp < start_time or timestamp > end_time:
+                        continue
+                    timestamp = int(timestamp / (60 * frequency_minutes))  # sum_minutes
+                    catalog = json_data.get('catalog', 'varada')
+
+                    stats: dict = json_data['stats']
+                    for group_tuple in stats.items():
+                        group_name_with_catalog = get_val(group_tuple, 0)
+                        group_name_splits = get_val(re_findall(r"([^\.]+)", group_name_with_catalog), 0)
+                        group_name = group_name_splits
+                        tup_dict = get_val(group_tuple, 1)
+                        if not tup_dict:
+                            continue
+                        metrics = dict(tup_dict).items()
+                        for metric_tuple in metrics:
+                            metric_name = get_val(metric_tuple, 0)
+                            metric_value = get_val(metric_tuple, 1)
+                            values = re_findall(r"([\+\-][\d]+).*\(([\d]+)\)", metric_value)
+                            if len(values) == 0:
+                                continue
+                            if metric_name in delta_metrics:
+                                val = int(get_val(values[0], 1))
+                            else:
+                                val = int(get_val(values[0], 0))
+                            keyname = f"{group_name}-{metric_name}"
+                            if catalog_ts_jsons.get(catalog) is None:
+                                catalog_ts_jsons[catalog] = collections.defaultdict(dict)
+                            if catalog_ts_jsons.get(catalog).get(timestamp) is None:
+                                catalog_ts_jsons[catalog][timestamp] = {"timestamp": timestamp_str}
+                            if catalog_ts_jsons[catalog][timestamp].get(keyname) is None:
+                                catalog_ts_jsons[catalog][timestamp][keyname] = val
+                            else:
+                                catalog_ts_jsons[catalog][timestamp][keyname] += val
+
+    return catalog_ts_jsons
+
+
+def get_stats(line_splits):
+    if len(line_splits[0]) > 1 and "stats\":" in line_splits[0][1]:
+        return line_splits[0][1]
+    return None
+
+
+def get_timestamp(line_splits):
+    if len(line_splits[0]):
+        return line_splits[0][0]
+    return None
+
+
+def get_val(vals, pos):
+    if len(vals) > pos:
+        return vals[pos]
+    return None
+
+
+def slog_chunks(slog: str) -> Iterator[str]:
+    """
+    The slog in chunks of whole lines, so the baseline doesn't need the whole slog in memory
+    """
+    with open(slog) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk + f.readline()
+
+
+def metrics_store(slog_files: Iterable[str], frequency_minutes: int, start_time, end_time, delta_metrics):
+    """
+    The same through the slog parser and the metrics series, as call_home_methods.run does
+    """
+    metrics = SlogMetrics(resolution_minutes(frequency_minutes), start_time, end_time, delta_metrics)
+    for slog in slog_files:
+        for line in slog.split("\n"):
+            metrics.add_line(line)
+    return metrics.resample(frequency_minutes)
+
+
+def same_results(catalog_ts_jsons: dict, catalogs: Dict[str, MetricsSeries]) -> bool:
+    if list(catalog_ts_jsons) != list(catalogs):
+        return False
+    for catalog, buckets in catalog_ts_jsons.items():
+        series = catalogs[catalog]
+        keys = {key for values in buckets.values() for key in values if key != "timestamp"}
+        if not keys <= set(series.keys) or [values["timestamp"] for values in buckets.values()] != series.labels():
+            return False
+        for key in series.keys:
+            if [values.get(key, 0) for values in buckets.values()] != series.series(key).tolist():
+                return False
+    return True
+
+
+def measure(slog: str, get_metrics: Callable):
+    start = perf_counter()
+    results = get_metrics(slog_chunks(slog), GRANULARITY_MINUTES, 0, 2 ** 32, DELTA_METRICS)
+    return perf_counter() - start, results
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--metrics-every", type=int, default=20, help="one METRICS-DUMP line every that many lines")
+    parser.add_argument("--slog", help="parse this slog instead of a synthetic one")
+    options = parser.parse_args()
+    with TemporaryDirectory() as tmp:
+        slog = options.slog
+        if not slog:
+            slog = path.join(tmp, "server.log")
+            generate(slog=slog, size_mb=options.size_mb, metrics_every=options.metrics_every)
+        size_mb = path.getsize(slog) / 1024 / 1024
+        baseline_seconds, baseline_results = measure(slog, baseline_get_slog_metrics)
+        seconds, results = measure(slog, metrics_store)
+    if not same_results(baseline_results, results):
+        print(f"FAIL results differ from the baseline on {slog}")
+        raise SystemExit(1)
+    print(f"{size_mb:.0f}MB, {sum(len(series.buckets) for series in results.values())} buckets of "
+          f"{GRANULARITY_MINUTES} minutes")
+    print(f"baseline      {baseline_seconds:.2f}s {size_mb / baseline_seconds:.1f}MB/s")
+    print(f"slog parser   {seconds:.2f}s {size_mb / seconds:.1f}MB/s, {baseline_seconds / seconds:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
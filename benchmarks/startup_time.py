@@ -0,0 +1,69 @@
+"""
+vtm startup time benchmark, guards the lazy loading of the command groups.
+
+Runs every case in a fresh interpreter, reports the median wall time and fails if a command imports dependencies
+it doesn't need or is slower than --max-seconds:
+
+    python benchmarks/startup_time.py [--runs 10] [--max-seconds 0.5]
+"""
+from sys import executable
+from json import loads, dumps
+from statistics import median
+from time import perf_counter
+from subprocess import run, PIPE
+from argparse import ArgumentParser
+
+HEAVY_MODULES = ["matplotlib", "boto3", "paramiko", "trino", "prestodb"]
+
+# command line -> heavy modules the command is allowed to import
+CASES = {
+    ("config", "template"): [],
+    ("config", "--help"): [],
+    ("ssh", "--help"): ["paramiko"],
+    ("query", "--help"): ["paramiko"],
+    ("call-home", "--help"): ["matplotlib", "boto3"],
+}
+
+SCRIPT = """
+import sys
+sys.argv = ["vtm"] + {args}
+from varada_trino_manager.main import main
+try:
+    main()
+except SystemExit:
+    pass
+print({marker!r} + __import__("json").dumps(sorted({{m.split(".")[0] for m in sys.modules}} & set({heavy}))))
+"""
+MARKER = "HEAVY_MODULES="
+
+
+def measure(args: tuple, runs: int):
+    timings, imported = [], []
+    for _ in range(runs):
+        start = perf_counter()
+        result = run([executable, "-c", SCRIPT.format(args=dumps(list(args)), marker=MARKER, heavy=HEAVY_MODULES)],
+                     stdout=PIPE, stderr=PIPE, universal_newlines=True, check=True)
+        timings.append(perf_counter() - start)
+        imported = loads(result.stdout.rsplit(MARKER, 1)[1])
+    return median(timings), imported
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-seconds", type=float, default=0.5)
+    options = parser.parse_args()
+    failed = False
+    for args, allowed in CASES.items():
+        seconds, imported = measure(args=args, runs=options.runs)
+        unexpected = sorted(set(imported) - set(allowed))
+        status = "OK"
+        if unexpected or (not allowed and seconds > options.max_seconds):
+            status = "FAIL"
+            failed = True
+        print(f"{status:4} vtm {' '.join(args):24} {seconds:.3f}s imported: {', '.join(imported) or '-'}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
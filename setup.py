@@ -28,13 +28,13 @@ setup(
         "paramiko==2.7.2",
         "requests==2.25.1",
         "jsons==1.4.2",
-        "sshtunnel==0.4.0",
         "pydantic==1.8.1",
         "trino==0.305.0",
         "presto-python-client==0.7.0",
         'matplotlib==3.5.1',
         'boto3==1.16.25',
-        'urlpath==1.1.7'
+        'urlpath==1.1.7',
+        'numpy>=1.17'
     ],
     extras_require={
         "dev": [
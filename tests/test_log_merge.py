@@ -0,0 +1,54 @@
+from threading import Thread
+from varada_trino_manager.infra.log_merge import line_timestamp, merge_by_timestamp, QueueIterator
+
+
+def stream(*timestamps: str):
+    for timestamp in timestamps:
+        yield timestamp, f"{timestamp} line"
+
+
+def test_merge_orders_by_timestamp():
+    merged = merge_by_timestamp(streams={
+        "node1": stream("2022-02-08T06:00:01.000Z", "2022-02-08T06:00:04.000Z"),
+        "node2": stream("2022-02-08T06:00:02.000Z", "2022-02-08T06:00:03.000Z", "2022-02-08T06:00:05.000Z"),
+        "node3": stream(),
+    })
+    assert [(timestamp[17:19], node) for timestamp, node, _ in merged] == \
+        [("01", "node1"), ("02", "node2"), ("03", "node2"), ("04", "node1"), ("05", "node2")]
+
+
+def test_merge_keeps_stream_order_of_equal_timestamps():
+    merged = merge_by_timestamp(streams={"node2": stream("t1", "t2"), "node1": stream("t1", "t2")})
+    assert [(timestamp, node) for timestamp, node, _ in merged] == \
+        [("t1", "node2"), ("t1", "node1"), ("t2", "node2"), ("t2", "node1")]
+
+
+def test_merge_is_lazy():
+    pulled = []
+
+    def counted(node: str):
+        for timestamp in ["t1", "t2", "t3"]:
+            pulled.append(node)
+            yield timestamp, ""
+
+    merged = merge_by_timestamp(streams={"node1": counted("node1"), "node2": counted("node2")})
+    next(merged)
+    assert sorted(pulled) == ["node1", "node2"]
+
+
+def test_line_timestamp():
+    assert line_timestamp("2022-02-08T06:39:23.787Z\tINFO\tmain\tstarted") == "2022-02-08T06:39:23.787Z"
+    assert line_timestamp("2022-02-08T06:39:23+02:00 INFO") == "2022-02-08T06:39:23+02:00"
+    assert line_timestamp("\tat io.trino.Main.main(Main.java:10)") is None
+
+
+def test_queue_iterator():
+    items = QueueIterator()
+
+    def produce():
+        for item in range(3):
+            items.put(item)
+        items.close()
+
+    Thread(target=produce).start()
+    assert list(items) == [0, 1, 2]
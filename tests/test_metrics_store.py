@@ -0,0 +1,74 @@
+from datetime import datetime
+from varada_trino_manager.infra.metrics_store import MetricsSeries
+
+
+def label(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%m/%d/%Y %H:%M')
+
+
+def test_add_sums_per_bucket_in_first_seen_order():
+    series = MetricsSeries()
+    series.add(bucket=5, timestamp=300, values={"a": 1})
+    series.add(bucket=3, timestamp=180, values={"a": 2, "b": 4})
+    series.add(bucket=5, timestamp=330, values={"a": 10})
+    assert series.labels() == [label(300), label(180)]
+    assert series.buckets.tolist() == [5, 3]
+    assert series.keys == ["a", "b"]
+    assert series.series("a").tolist() == [11, 2]
+    assert series.series("b").tolist() == [0, 4]
+    assert series.series("missing").tolist() == [0, 0]
+
+
+def test_compact_is_incremental():
+    series = MetricsSeries()
+    series.add(bucket=1, timestamp=60, values={"a": 1})
+    series.compact()
+    series.add(bucket=1, timestamp=90, values={"a": 2, "b": 1})
+    series.add(bucket=2, timestamp=120, values={"b": 5})
+    assert series.compact().values.tolist() == [[3, 0], [1, 5]]
+    assert series.first_seen.tolist() == [60, 120]
+
+
+def test_merge_appends_new_buckets_and_keys():
+    first, second = MetricsSeries(), MetricsSeries()
+    first.add(bucket=1, timestamp=60, values={"a": 1})
+    first.add(bucket=2, timestamp=120, values={"a": 2})
+    second.add(bucket=3, timestamp=180, values={"b": 7})
+    second.add(bucket=1, timestamp=70, values={"a": 10, "b": 1})
+    first.merge(second)
+    assert first.buckets.tolist() == [1, 2, 3]
+    # a merged bucket keeps the first seen time it already had
+    assert first.first_seen.tolist() == [60, 120, 180]
+    assert first.series("a").tolist() == [11, 2, 0]
+    assert first.series("b").tolist() == [1, 0, 7]
+
+
+def test_resample_sums_consecutive_buckets():
+    series = MetricsSeries()
+    for minute in [7, 3, 4, 10, 5, 11]:
+        series.add(bucket=minute, timestamp=minute * 60, values={"a": minute})
+    resampled = series.resample(5)
+    assert resampled.buckets.tolist() == [1, 0, 2]
+    assert resampled.series("a").tolist() == [7 + 5, 3 + 4, 10 + 11]
+    assert resampled.labels() == [label(7 * 60), label(3 * 60), label(10 * 60)]
+    assert series.resample(1) is series
+
+
+def test_max_samples():
+    series = MetricsSeries()
+    for bucket in range(5):
+        series.add(bucket=bucket, timestamp=bucket * 60, values={"a": bucket})
+    assert series.series("a", max_samples=3).tolist() == [0, 1, 2]
+    assert series.series("b", max_samples=3).tolist() == [0, 0, 0]
+    assert len(series.labels(max_samples=3)) == 3
+
+
+def test_dict_round_trip():
+    series = MetricsSeries()
+    series.add(bucket=2, timestamp=120, values={"a": 1, "b": 2})
+    series.add(bucket=1, timestamp=60, values={"b": 3})
+    loaded = MetricsSeries.from_dict(series.to_dict())
+    assert loaded.to_dict() == series.to_dict()
+    loaded.add(bucket=1, timestamp=61, values={"c": 4})
+    assert loaded.series("b").tolist() == [2, 3]
+    assert loaded.series("c").tolist() == [0, 4]
@@ -0,0 +1,39 @@
+from pytest import approx, raises
+from varada_trino_manager.infra.run_queries import arrival_times
+
+
+def test_constant_arrivals():
+    assert list(arrival_times(rate=2, duration=3, arrival="constant")) == approx([0.5, 1, 1.5, 2, 2.5, 3])
+
+
+def test_poisson_arrivals():
+    offsets = list(arrival_times(rate=50, duration=100, arrival="poisson"))
+    assert offsets == sorted(offsets)
+    assert 0 < offsets[0] and offsets[-1] <= 100
+    assert 4500 < len(offsets) < 5500
+
+
+def test_ramp_arrivals():
+    offsets = list(arrival_times(rate=10, duration=100, arrival="ramp", ramp_from=0))
+    # the average rate over the ramp is half the final rate
+    assert len(offsets) == 500
+    assert offsets == sorted(offsets)
+    first_half = sum(1 for offset in offsets if offset <= 50)
+    assert first_half == 125
+
+
+def test_ramp_down_arrivals():
+    offsets = list(arrival_times(rate=1, duration=10, arrival="ramp", ramp_from=3))
+    assert len(offsets) == 20
+    assert offsets[1] - offsets[0] < offsets[-1] - offsets[-2]
+
+
+def test_flat_ramp_is_constant():
+    assert list(arrival_times(rate=1, duration=3, arrival="ramp", ramp_from=1)) == approx([1, 2, 3])
+
+
+def test_invalid_rates():
+    with raises(ValueError):
+        next(arrival_times(rate=0, duration=10, arrival="constant"))
+    with raises(ValueError):
+        next(arrival_times(rate=1, duration=10, arrival="ramp", ramp_from=-1))
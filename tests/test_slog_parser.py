@@ -0,0 +1,77 @@
+from json import dumps
+from time import mktime
+from datetime import datetime
+from pytest import mark
+from varada_trino_manager.infra.slog_parser import MetricsDumpParser, parse_value, line_timestamp_ms
+
+DELTA_METRICS = "cached_total_rows,task_pending"
+
+
+def metrics_line(payload: dict, head: str = "2022-02-08T06:39:23.787Z\tINFO\tTimer-1\t") -> str:
+    return f"{head}METRICS-DUMP\t{dumps(payload)}"
+
+
+@mark.parametrize("value, absolute, expected", [
+    ("+10 (2197)", False, 10),
+    ("+10 (2197)", True, 2197),
+    ("-3 (7)", False, -3),
+    ("+10 total (2197)", True, 2197),
+    ("10 (2197)", False, None),
+    ("n/a", True, None),
+    (5, True, None),
+])
+def test_parse_value(value, absolute, expected):
+    assert parse_value(value, absolute) == expected
+
+
+def test_line_timestamp_ms_is_local_time():
+    expected = mktime(datetime(2022, 2, 8, 6, 39, 23).timetuple()) * 1000 + 787
+    assert line_timestamp_ms("2022-02-08T06:39:23.787Z") == expected
+    assert line_timestamp_ms("not a timestamp") is None
+
+
+def test_parse_metrics_line():
+    parser = MetricsDumpParser(DELTA_METRICS)
+    line = metrics_line({"stats": {"dispatcherPageSource.varada": {"cached_total_rows": "+10 (2197)",
+                                                                   "cached_files": "+2 (40)"},
+                                   "worker-task-executor.hive": {"task_pending": "-1 (3)"},
+                                   "empty.varada": {}},
+                         "catalog": "hive", "timestamp": 1644304595437})
+    assert parser.parse(line) == ("hive", 1644304595.437, {"dispatcherPageSource-cached_total_rows": 2197,
+                                                           "dispatcherPageSource-cached_files": 2,
+                                                           "worker-task-executor-task_pending": 3})
+    # the key names are cached per group and metric, a second line parses the same
+    assert parser.parse(line) == parser.parse(line)
+
+
+def test_parse_sums_groups_of_the_same_key():
+    parser = MetricsDumpParser(DELTA_METRICS)
+    line = metrics_line({"stats": {"dictionary.varada": {"dictionaries_size": "+1 (5)"},
+                                   "dictionary.hive": {"dictionaries_size": "+2 (6)"}}, "timestamp": 1000})
+    assert parser.parse(line) == ("varada", 1, {"dictionary-dictionaries_size": 3})
+
+
+def test_parse_line_timestamp_fallback():
+    parser = MetricsDumpParser(DELTA_METRICS)
+    catalog, timestamp, values = parser.parse(metrics_line({"stats": {"g.varada": {"m": "+1 (1)"}}}))
+    assert timestamp == line_timestamp_ms("2022-02-08T06:39:23.787Z") / 1000
+
+
+def test_parse_unusual_line_shapes():
+    parser = MetricsDumpParser(DELTA_METRICS)
+    payload = {"stats": {"g.varada": {"m": "+1 (1)"}}, "timestamp": 2000}
+    # extra whitespace and a second marker go through the full line pattern
+    assert parser.parse(metrics_line(payload, head="2022-02-08T06:39:23.787Z  INFO  METRICS-DUMP x ")) == \
+        ("varada", 2, {"g-m": 1})
+    assert parser.parse(metrics_line(payload, head="2022-02-08T06:39:23.787Z\tINFO\t")) == ("varada", 2, {"g-m": 1})
+
+
+@mark.parametrize("line", [
+    "2022-02-08T06:39:23.787Z\tINFO\tdispatcher\tQuery finished",
+    "2022-02-08T06:39:23.787Z\tERROR\tTimer-1\tMETRICS-DUMP\t{\"stats\": {}}",
+    "2022-02-08T06:39:23.787Z\tINFO\tTimer-1\tMETRICS-DUMP\t{\"no\": 1}",
+    "2022-02-08T06:39:23.787Z\tINFO\tTimer-1\tMETRICS-DUMP{\"stats\": {}}",
+    "",
+])
+def test_parse_other_lines(line):
+    assert MetricsDumpParser(DELTA_METRICS).parse(line) is None
@@ -0,0 +1,89 @@
+from random import Random
+from pytest import approx
+from varada_trino_manager.infra.stats import percentile, Histogram, QueriesStats, RunStats
+
+
+def query_data(elapsed: float, name: str = "q1") -> dict:
+    return {"queryName": name, "elapsedTime": elapsed, "cpuTime": elapsed / 2, "processedRows": 10,
+            "processedBytes": 100}
+
+
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 99) == 5
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) == 0
+
+
+def test_histogram_exact_below_sub_buckets():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(99) == 99
+    assert histogram.percentile(100) == 100
+    assert (histogram.count, histogram.min, histogram.max, histogram.mean) == (100, 1, 100, 50.5)
+
+
+def test_histogram_percentiles_within_one_percent():
+    random = Random(4)
+    values = [random.randint(0, 10 ** 7) for _ in range(10000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    for pct in [50, 90, 95, 99, 99.9]:
+        exact = percentile(values, pct)
+        assert exact <= histogram.percentile(pct) <= exact * 1.01
+
+
+def test_histogram_rounds_and_clamps():
+    histogram = Histogram()
+    histogram.record(-3)
+    histogram.record(2.6)
+    assert (histogram.min, histogram.max, histogram.total) == (0, 3, 3)
+    assert Histogram().percentile(50) == 0
+
+
+def test_histogram_compact_groups_power_of_two_ranges():
+    histogram = Histogram()
+    for value in [0, 1, 2, 3, 300, 511, 512]:
+        histogram.record(value)
+    assert histogram.compact() == [[0, 1], [1, 1], [3, 2], [511, 2], [1023, 1]]
+
+
+def test_histogram_merge_equals_recording_all():
+    random = Random(7)
+    values = [random.randint(0, 10 ** 6) for _ in range(2000)]
+    merged, left, right = Histogram(), Histogram(), Histogram()
+    for index, value in enumerate(values):
+        merged.record(value)
+        (left if index % 3 else right).record(value)
+    assert left.merge(right).summary() == merged.summary()
+    assert left.merge(Histogram()).summary() == merged.summary()
+    assert Histogram().merge(merged).summary() == merged.summary()
+
+
+def test_queries_stats_merge():
+    first, second = QueriesStats(), QueriesStats()
+    first.add(query_data(1))
+    second.add(query_data(3))
+    summary = first.merge(second).summary(wall_seconds=2)
+    assert summary["elapsedTime"]["count"] == 2
+    assert summary["elapsedTime"]["max"] == 3
+    assert summary["processedRows"] == 20
+    # over the wall clock time, not the 4 seconds the two queries took together
+    assert summary["rowsPerSecond"] == approx(10)
+    assert summary["bytesPerSecond"] == approx(100)
+    assert QueriesStats().summary(wall_seconds=0)["rowsPerSecond"] == 0
+
+
+def test_run_stats_overall_merges_workloads():
+    run_stats = RunStats()
+    run_stats.add(query_data(1, name="q1"), workload=1)
+    run_stats.add(query_data(2, name="q2"), workload=2)
+    summary = run_stats.summary(wall_seconds=2)
+    assert set(summary["workloads"]) == {"workload1", "workload2"}
+    assert set(summary["queries"]) == {"q1", "q2"}
+    assert summary["overall"]["elapsedTime"]["count"] == 2
+    assert summary["overall"]["processedBytes"] == 200
@@ -1,11 +1,29 @@
-from .ssh import ssh
-from .etc import etc
-from .logs import logs
-from .rules import rules
-from .query import query
-from .server import server
-from .config import config
-from .connector import connector
-from .call_home import call_home
-
-commands_groups = [ssh, etc, logs, rules, query, server, config, connector, call_home]
+from click import Group
+from importlib import import_module
+
+# command group name -> module (in this package) defining the group under the same name, the module is imported
+# only when the group is invoked, so every command pays just for its own dependencies
+commands_groups = {
+    "ssh": "ssh",
+    "etc": "etc",
+    "logs": "logs",
+    "rules": "rules",
+    "query": "query",
+    "server": "server",
+    "config": "config",
+    "connector": "connector",
+    "call-home": "call_home",
+}
+
+
+class LazyGroup(Group):
+    def list_commands(self, ctx):
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(commands_groups))
+
+    def get_command(self, ctx, cmd_name):
+        command = super(LazyGroup, self).get_command(ctx, cmd_name)
+        if command is None and cmd_name in commands_groups:
+            module_name = commands_groups[cmd_name]
+            command = getattr(import_module(f".{module_name}", __name__), module_name)
+            self.add_command(command, name=cmd_name)
+        return command
@@ -47,7 +47,19 @@ def template():
                 "username": "root",
             },
             "distribution": {"brand": "trino", "port": Common.API_PORT},
-            "varada": {"port": Common.VARADA_PORT}
+            "varada": {"port": Common.VARADA_PORT},
+            "http": {
+                "pool_connections": Common.HTTP_POOL_CONNECTIONS,
+                "pool_maxsize": Common.HTTP_POOL_MAXSIZE,
+                "retries": Common.HTTP_RETRIES,
+                "backoff_factor": Common.HTTP_BACKOFF_FACTOR,
+            },
+            "fanout": {
+                "max_parallel": Common.FANOUT_MAX_PARALLEL,
+                "max_parallel_per_bastion": Common.FANOUT_MAX_PARALLEL_PER_BASTION,
+                "retries": Common.FANOUT_RETRIES,
+                "backoff_factor": Common.FANOUT_BACKOFF_FACTOR,
+            },
         }
     )
     echo(f"With bastion and distribution:\n{dumps(data, indent=2)}")
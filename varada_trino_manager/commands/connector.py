@@ -1,5 +1,5 @@
 from click import option, group, echo, Path as ClickPath
-from ..infra.remote import parallel_ssh_execute, parallel_upload
+from ..infra.remote import parallel_ssh_execute, parallel_upload, relay_upload
 
 
 @group()
@@ -44,6 +44,13 @@ def connector():
     help="User that runs the presto server",
     default=None,
 )
+@option(
+    "-r",
+    "--relay",
+    is_flag=True,
+    help="Upload the targz only to the coordinator and relay it node to node (requires ssh between the nodes)",
+    default=False,
+)
 @connector.command()
 def install(
     targz_path: str,
@@ -51,13 +58,19 @@ def install(
     external_install_script_path: str,
     installation_dir: str,
     user: str,
+    relay: bool,
 ):
     """
     Install Varada connector
     """
-    parallel_upload(
-        local_file_path=targz_path, remote_file_path="/tmp/varada-connector.tar.gz"
-    )
+    if relay:
+        relay_upload(
+            local_file_path=targz_path, remote_file_path="/tmp/varada-connector.tar.gz"
+        )
+    else:
+        parallel_upload(
+            local_file_path=targz_path, remote_file_path="/tmp/varada-connector.tar.gz"
+        )
     if external_install_script_path:
         parallel_upload(
             local_file_path=external_install_script_path,
@@ -1,8 +1,13 @@
 from ..infra.constants import Paths
 from ..infra.connections import VaradaRest
 from ..infra.rest_commands import RestCommands
-from click import group, option, Path as ClickPath, argument
-from ..infra.remote import parallel_ssh_execute, parallel_download, parallel_rest_execute
+from ..infra.incremental_logs import collect_incremental, REMOTE_LOGS_DIR
+from click import group, option, Path as ClickPath, argument, Choice, BadParameter, echo
+from ..infra.log_grep import grep_logs
+from ..infra.log_timeline import timeline as logs_timeline
+from ..infra.log_merge import to_log_timestamp
+from ..infra.log_bundle import collect_bundle, CODECS
+from ..infra.remote import parallel_ssh_execute, parallel_rest_execute
 
 
 @group()
@@ -39,26 +44,97 @@ def clear():
     default=None,
     help="Destination dir to save the logs",
 )
+@option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help=f"Only fetch what was appended to the files in {REMOTE_LOGS_DIR} since the last incremental collection",
+)
+@option(
+    "-c",
+    "--codec",
+    type=Choice(list(CODECS)),
+    default="gzip",
+    show_default=True,
+    help="Compression of the logs archive streamed from the nodes, pigz and zstd compress with all the node's cores",
+)
+@option(
+    "-x",
+    "--extract",
+    is_flag=True,
+    default=False,
+    help="Also extract the logs archive while it is downloaded (not supported with zstd)",
+)
 @logs.command()
-def collect(destination_dir: str):
+def collect(destination_dir: str, incremental: bool, codec: str, extract: bool):
     """
     Collect fresh logs and store in logs dir, overwiting existing one
     """
-    commands = [
-        "sudo rm -rf /tmp/custom_logs",
-        "mkdir /tmp/custom_logs",
-        "sudo dmesg > /tmp/custom_logs/dmesg",
-        "sudo jps > /tmp/custom_logs/jps",
-        'grep TrinoServer /tmp/custom_logs/jps | cut -d" " -f1 > /tmp/custom_logs/server.pid || true',
-        "sudo jstack $(cat /tmp/custom_logs/server.pid) > /tmp/custom_logs/jstack.txt || true",
-        "cp /var/log/presto/* /tmp/custom_logs/ || true",
-        "sudo cp /var/log/messages /tmp/custom_logs/",
-        "sudo cp /var/log/user-data.log /tmp/custom_logs/",
-        "sudo tar -C /tmp/custom_logs -zcf /tmp/custom_logs.tar.gz .",
-        "sudo chmod 777 /tmp/custom_logs.tar.gz",
-    ]
-    parallel_ssh_execute(command="\n".join(commands))
     dir_path = Paths.logs_path if destination_dir is None else destination_dir
-    parallel_download(
-        remote_file_path="/tmp/custom_logs.tar.gz", local_dir_path=dir_path
-    )
+    if incremental:
+        collect_incremental(local_dir_path=dir_path)
+        return
+    if extract and not CODECS[codec].extractable:
+        raise BadParameter(f"{codec} archives can't be extracted on the fly", param_hint="--extract")
+    collect_bundle(local_dir_path=str(dir_path), codec_name=codec, extract=extract)
+
+
+@argument("pattern")
+@option(
+    "-s",
+    "--since",
+    type=str,
+    default=None,
+    help="Only lines logged since, a UTC timestamp such as 2021-06-01T12:00:00 or a duration ago such as 30m or 1h30m",
+)
+@option(
+    "-u",
+    "--until",
+    type=str,
+    default=None,
+    help="Only lines logged before, a UTC timestamp or a duration ago",
+)
+@option(
+    "-f",
+    "--files",
+    type=str,
+    default="server.log*",
+    show_default=True,
+    help=f"Files to search in {REMOTE_LOGS_DIR}, a shell glob, gzipped rotated files are searched too",
+)
+@option("-i", "--ignore-case", is_flag=True, default=False, help="Case insensitive pattern")
+@logs.command()
+def grep(pattern: str, since: str, until: str, files: str, ignore_case: bool):
+    """
+    Search the nodes logs for an extended regular expression (awk), the search runs on the nodes and only the
+    matching lines are streamed back, merged by timestamp
+    """
+    try:
+        since = to_log_timestamp(since) if since else None
+        until = to_log_timestamp(until) if until else None
+    except ValueError as e:
+        raise BadParameter(str(e), param_hint="--since/--until")
+    for hostname, line in grep_logs(pattern=pattern, since=since, until=until, files=files, ignore_case=ignore_case):
+        echo(f"{hostname}: {line}")
+
+
+@option(
+    "-d",
+    "--logs-dir",
+    type=ClickPath(exists=True, file_okay=False),
+    default=None,
+    help="Dir the logs were collected to, defaults to the logs dir",
+)
+@option("-f", "--file-name", type=str, default="server.log", show_default=True, help="Log file to merge")
+@option("-q", "--query", type=str, default=None, help="Only the part of the timeline the query runner ran this query in")
+@option("-m", "--markers-only", is_flag=True, default=False, help="Only the VTM markers, such as VTM Run Query")
+@logs.command()
+def timeline(logs_dir: str, file_name: str, query: str, markers_only: bool):
+    """
+    Print the collected logs of all the nodes as one timeline ordered by timestamp, every line prefixed by its node
+    """
+    dir_path = Paths.logs_path if logs_dir is None else logs_dir
+    for _, node, line in logs_timeline(logs_dir_path=str(dir_path), file_name=file_name, query=query,
+                                       markers_only=markers_only):
+        echo(f"{node}: {line}")
@@ -1,9 +1,9 @@
 from ..infra.constants import Paths
 from ..infra.configuration import get_config
 from ..infra.rest_commands import RestCommands
-from ..infra.run_queries import run as query_runner
-from ..infra.utils import logger, session_props_to_dict
-from click import group, option, Path as ClickPath, argument
+from ..infra.run_queries import run as query_runner, ARRIVAL_SCHEDULES
+from ..infra.utils import logger, session_props_to_dict, duration_to_seconds
+from click import group, option, Path as ClickPath, argument, BadParameter, Choice, FloatRange, IntRange
 from ..infra.query_json_jstack import run as query_json_jstack
 
 
@@ -67,8 +67,15 @@ def query():
     "--get-results",
     is_flag=True,
     default=False,
-    help="Print query results. Returns full results for a single query, up to 10 rows for multiple queries. "
-         "Please mind the results set size for log readability and test machine mem size.",
+    help="Print query results. Prints up to 10 rows, the full results of each query are streamed to a file "
+         "in destination-dir (-d).",
+)
+@option(
+    "-gf",
+    "--results-format",
+    type=Choice(["jsonl", "csv"]),
+    default="jsonl",
+    help="File format of the full query results when get results (-g) is selected, default jsonl",
 )
 @option(
     "-p",
@@ -105,6 +112,44 @@ def query():
     default=Paths.logs_path,
     help=f"Destination dir to save the run results and query jsons (optional), by default will be created under {Paths.logs_path}",
 )
+@option(
+    "-du",
+    "--duration",
+    type=str,
+    default=None,
+    help="Run for a duration, for example 90s, 30m or 1h, keeping exactly concurrency (-c) queries in flight. "
+         "Queries are drawn randomly from the file, or from queries_list if given",
+)
+@option(
+    "-ri",
+    "--report-interval",
+    type=IntRange(min=1),
+    default=60,
+    help="Number of seconds between throughput and latency reports when running with duration (-du), default 60",
+)
+@option(
+    "-qps",
+    "--rate",
+    type=float,
+    default=None,
+    help="Open loop: launch queries at this arrival rate (queries per second) regardless of completions, "
+         "requires duration (-du). Concurrency (-c), if given, caps the queries in flight",
+)
+@option(
+    "-a",
+    "--arrival",
+    type=Choice(ARRIVAL_SCHEDULES),
+    default="constant",
+    help="Arrival schedule for the rate option (-qps), ramp grows the rate linearly from --ramp-from, "
+         "default constant",
+)
+@option(
+    "-rf",
+    "--ramp-from",
+    type=FloatRange(min=0),
+    default=0,
+    help="Arrival rate (queries per second) at the start of a ramp schedule, default 0",
+)
 @argument("queries_list", nargs=-1)
 @query.command()
 def runner(
@@ -116,11 +161,17 @@ def runner(
     sleep,
     queries_list,
     get_results,
+    results_format,
     session_properties,
     catalog,
     collect_jsons,
     destination_dir,
     jmx_stats,
+    duration,
+    report_interval,
+    rate,
+    arrival,
+    ramp_from,
 ):
     """
     Run queries on Varada Cluster, per the following examples:
@@ -132,8 +183,18 @@ def runner(
         vtm -v query runner -j <queries.json> q1,q2,q3 q4,q5     => Run q1,q2,q3 serially, run in parallel q4,q5, be verbose
         vtm -v query runner -f <queries> 0,1,2 3,4      => Same as above, for text file where queries_list consists of indices of sql statements in the file (starting with 0)
         vtm query runner -j <queries.json> -c 6 -r            => Run randomly selected queries to run with concurrency 6
+        vtm query runner -j <queries.json> -c 6 -du 30m       => Keep 6 random queries in flight for 30 minutes
+        vtm query runner -j <queries.json> -qps 2 -a poisson -du 30m  => Launch random queries at 2 per second
     \b
     """
+    try:
+        duration_seconds = duration_to_seconds(duration) if duration else None
+    except ValueError as e:
+        raise BadParameter(str(e), param_hint="--duration")
+    if duration_seconds is not None and duration_seconds <= 0:
+        raise BadParameter("Duration must be greater than 0", param_hint="--duration")
+    if rate is not None and rate <= 0:
+        raise BadParameter("Arrival rate must be greater than 0", param_hint="--rate")
     con = get_config().get_connection_by_name("coordinator")
     properties = (
         session_props_to_dict(session_properties) if session_properties else None
@@ -150,10 +211,16 @@ def runner(
         con=con,
         destination_dir=destination_dir,
         get_results=get_results,
+        results_format=results_format,
         session_properties=properties,
         catalog=catalog if catalog else 'varada',
         collect_query_json=collect_jsons,
-        collect_dispatcher_stats=jmx_stats
+        collect_dispatcher_stats=jmx_stats,
+        duration=duration_seconds,
+        report_interval=report_interval,
+        rate=rate,
+        arrival=arrival,
+        ramp_from=ramp_from,
     )
 
 
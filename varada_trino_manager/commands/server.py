@@ -2,7 +2,7 @@ from click import group, echo
 from ..infra.connections import APIClient
 from ..infra.configuration import get_config
 from ..infra.rest_commands import RestCommands
-from ..infra.remote import parallel_ssh_execute, rest_execute
+from ..infra.remote import parallel_ssh_stream, rest_execute, report_exit_codes
 from ..infra.options import add_options, TARGET_MAP, NODES_OPTIONS
 
 
@@ -57,4 +57,4 @@ def status():
 
 def run_func(command: str, target: str):
     coordinator, workers = TARGET_MAP[target]
-    parallel_ssh_execute(command=command, coordinator=coordinator, workers=workers)
\ No newline at end of file
+    report_exit_codes(parallel_ssh_stream(command=command, coordinator=coordinator, workers=workers))
\ No newline at end of file
@@ -1,6 +1,6 @@
 from typing import Tuple
-from click import group, argument, echo
-from ..infra.remote import ssh_session, parallel_ssh_execute
+from click import group, argument
+from ..infra.remote import ssh_session, parallel_ssh_stream, report_exit_codes
 from ..infra.options import add_options, TARGET_MAP, NODES_OPTIONS
 
 
@@ -29,8 +29,7 @@ def connect(node):
 @ssh.command()
 def command(target: str, command: Tuple[str]):
     """
-    Send command via SSH to all nodes
+    Send command via SSH to all nodes, the output is streamed line by line prefixed by the node's hostname
     """
     coordinator, workers = TARGET_MAP[target]
-    for task, hostname in parallel_ssh_execute(" ".join(command), coordinator=coordinator, workers=workers):
-        echo(f"{hostname}: {task.result()}")
+    report_exit_codes(parallel_ssh_stream(" ".join(command), coordinator=coordinator, workers=workers))
@@ -0,0 +1,127 @@
+from .utils import logger
+from select import select
+from atexit import register
+from threading import Lock, Thread
+from typing import Tuple, Optional
+from .configuration import Connection
+from paramiko.channel import Channel
+from paramiko import AutoAddPolicy, SSHClient
+from socketserver import ThreadingTCPServer, BaseRequestHandler
+
+
+class ForwardHandler(BaseRequestHandler):
+    BUFFER_SIZE = 64 * 1024
+
+    def handle(self):
+        try:
+            channel = self.server.session.open_channel(remote_address=self.server.remote_address,
+                                                       origin_address=self.request.getpeername())
+        except Exception:
+            logger.exception(f"Failed forwarding to {self.server.remote_address} through {self.server.session}")
+            return
+        try:
+            while True:
+                readable, _, _ = select([self.request, channel], [], [])
+                if self.request in readable:
+                    data = self.request.recv(self.BUFFER_SIZE)
+                    if not data:
+                        break
+                    channel.sendall(data)
+                if channel in readable:
+                    data = channel.recv(self.BUFFER_SIZE)
+                    if not data:
+                        break
+                    self.request.sendall(data)
+        finally:
+            channel.close()
+
+
+class ForwardServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, session: "BastionSession", remote_address: Tuple[str, int]):
+        super(ForwardServer, self).__init__(("127.0.0.1", 0), ForwardHandler)
+        self.session = session
+        self.remote_address = remote_address
+
+
+class BastionSession:
+    """
+    A single SSH connection to a bastion, every forward (nodes SSH, Trino HTTP, Varada REST) is multiplexed over it
+    as direct-tcpip channels and exposed on a local port for the lifetime of the process
+    """
+
+    def __init__(self, hostname: str, port: int, username: str):
+        self.__hostname = hostname
+        self.__port = port
+        self.__username = username
+        self.__client: Optional[SSHClient] = None
+        self.__lock = Lock()
+        self.__forwards = {}
+
+    def __repr__(self) -> str:
+        return f"<bastion> {self.__username}@{self.__hostname}:{self.__port}"
+
+    def __connect(self) -> None:
+        logger.debug(f"Connecting to {self}")
+        self.__client = SSHClient()
+        self.__client.set_missing_host_key_policy(AutoAddPolicy)
+        self.__client.connect(hostname=self.__hostname, port=self.__port, username=self.__username, allow_agent=True)
+
+    def open_channel(self, remote_address: Tuple[str, int], origin_address: Tuple[str, int]) -> Channel:
+        with self.__lock:
+            transport = self.__client.get_transport() if self.__client is not None else None
+            if transport is None or not transport.is_active():
+                self.__connect()
+                transport = self.__client.get_transport()
+        return transport.open_channel("direct-tcpip", remote_address, origin_address)
+
+    def forward(self, hostname: str, port: int) -> Tuple[str, int]:
+        """
+        Local address forwarded to hostname:port through the bastion
+        """
+        with self.__lock:
+            if self.__client is None:
+                self.__connect()
+            server = self.__forwards.get((hostname, port))
+            if server is None:
+                server = ForwardServer(session=self, remote_address=(hostname, port))
+                Thread(target=server.serve_forever, daemon=True).start()
+                self.__forwards[(hostname, port)] = server
+                logger.debug(f"Forwarding {server.server_address} to {hostname}:{port} through {self}")
+        return server.server_address
+
+    def close(self) -> None:
+        with self.__lock:
+            for server in self.__forwards.values():
+                server.shutdown()
+                server.server_close()
+            self.__forwards.clear()
+            if self.__client is not None:
+                self.__client.close()
+                self.__client = None
+
+
+class BastionSessions:
+    def __init__(self):
+        self.__sessions = {}
+        self.__lock = Lock()
+
+    def get(self, con: Connection) -> BastionSession:
+        key = (con.bastion_hostname, con.bastion_port, con.bastion_username)
+        with self.__lock:
+            if key not in self.__sessions:
+                self.__sessions[key] = BastionSession(hostname=con.bastion_hostname, port=con.bastion_port,
+                                                      username=con.bastion_username)
+            return self.__sessions[key]
+
+    def close(self) -> None:
+        with self.__lock:
+            for session in self.__sessions.values():
+                session.close()
+            self.__sessions.clear()
+
+
+bastion_sessions = BastionSessions()
+register(bastion_sessions.close)
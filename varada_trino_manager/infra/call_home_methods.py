@@ -1,138 +1,37 @@
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
-from re import findall as re_findall
-import re
 import os
 import json
-import collections
 import datetime
 import time
 from .s3 import S3URL
+from .constants import Paths
+from .disk_cache import DiskCache
+from .slog_parser import SlogMetrics, parse_slog, resolution_minutes
+from .metrics_store import MetricsSeries
+from threading import Condition, Lock
+from tempfile import TemporaryDirectory, mkstemp
+from multiprocessing import get_context
+from typing import Callable, List, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from click import echo
 
 
-'''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
-                         Parse metrics
-
-example of metrics line in slog:
-2022-02-08T07:16:35.437Z	INFO	Timer-1	METRICS-DUMP	{"stats":{"dictionary.varada":{"dictionaries_size":"-55 (0)",
-                                                            "dictionary_read_elements_count":"+10 (21)","dictionary_entries":"-1 (0)",
-                                                            "dictionaries_varlen_str_size":"-55 (0)",
-                                                            "dictionary_loaded_elements_count":"+1 (14)"},
-                                                            "dispatcherPageSource.varada":{"varada_collect_columns":"+10 (2197)",
-                                                            "cached_total_rows":"+10 (127390974)","cached_files":"+10 (5957)",
-                                                            "prefilled_collect_columns":"+10 (3496)",
-                                                            "prefilled_collect_bytes":"+5 (34843226)",
-                                                            "varada_match_columns":"+10 (3853)","cached_varada_success_files":"+10 (5779)",
-                                                            "cached_read_rows":"+1 (37351331)"},"warmup-exporter.varada":{"export_disabled":"+10 (27289)"},
-                                                            "worker-task-executor.varada":{"task_scheduled":"+10 (36068)","task_finished":"+10 (36068)"}},
-                                                            "catalog":"varada","worker-nodes":1,"timestamp":1644304595437}
-
-'''
-
-
-def get_stats(line_splits):
-    if len(line_splits[0]) > 1 and "stats\":" in line_splits[0][1]:
-        return line_splits[0][1]
-    return None
-
-
-def get_timestamp(line_splits):
-    if len(line_splits[0]):
-        return line_splits[0][0]
-    return None
-
-
-def get_val(vals, pos):
-    if len(vals) > pos:
-        return vals[pos]
-    return None
-
-
-def get_slog_metrics(slog_files: list, frequency_minutes: int, start_time, end_time, delta_metrics):
-    catalog_ts_jsons = collections.defaultdict(lambda: collections.defaultdict(dict))
-    for slog in slog_files:
-        for line in slog.split('\n'):
-            if "METRICS-DUMP" in line:
-                line_splits = re_findall(r'([\S]+)[\s]+INFO.*METRICS-DUMP[\s]+(.*)', line)  # re_findall returns array of strings, we need the line with stat in the second string
-                json_stats = get_stats(line_splits)
-                if json_stats:
-                    json_data = json.loads(json_stats)
-                    timestamp = json_data.get('timestamp', get_timestamp(line_splits))
-                    if not timestamp:
-                        continue
-                    timestamp /= 1000  # seconds
-                    timestamp_str = datetime.datetime.fromtimestamp(timestamp).strftime('%m/%d/%Y %H:%M')
-
-                    if timestamp < start_time or timestamp > end_time:
-                        continue
-                    timestamp = int(timestamp / (60 * frequency_minutes))  # sum_minutes
-                    catalog = json_data.get('catalog', 'varada')
-
-                    stats: dict = json_data['stats']
-                    for group_tuple in stats.items():
-                        group_name_with_catalog = get_val(group_tuple, 0)
-                        group_name_splits = get_val(re_findall(r"([^\.]+)", group_name_with_catalog), 0)
-                        group_name = group_name_splits
-                        tup_dict = get_val(group_tuple, 1)
-                        if not tup_dict:
-                            continue
-                        metrics = dict(tup_dict).items()
-                        for metric_tuple in metrics:
-                            metric_name = get_val(metric_tuple, 0)
-                            metric_value = get_val(metric_tuple, 1)
-                            values = re_findall(r"([\+\-][\d]+).*\(([\d]+)\)", metric_value)
-                            if len(values) == 0:
-                                continue
-                            if metric_name in delta_metrics:
-                                val = int(get_val(values[0], 1))
-                            else:
-                                val = int(get_val(values[0], 0))
-                            keyname = f"{group_name}-{metric_name}"
-                            if catalog_ts_jsons.get(catalog) is None:
-                                catalog_ts_jsons[catalog] = collections.defaultdict(dict)
-                            if catalog_ts_jsons.get(catalog).get(timestamp) is None:
-                                catalog_ts_jsons[catalog][timestamp] = {"timestamp": timestamp_str}
-                            if catalog_ts_jsons[catalog][timestamp].get(keyname) is None:
-                                catalog_ts_jsons[catalog][timestamp][keyname] = val
-                            else:
-                                catalog_ts_jsons[catalog][timestamp][keyname] += val
-
-    return catalog_ts_jsons
-
-
 '''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
                         Draw graphs
 '''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
 
 
-def get_x_y(key: str, ts_keys: collections.defaultdict(dict), max_samples: int):
-    vals = []
-    cols = []
-    for samples_count, (ts, dictkeys) in enumerate(ts_keys.items()):
-        if samples_count == max_samples:
-            break
-        cols.append(dictkeys["timestamp"])
-        fillkey = False
-        for key_dict, val in dictkeys.items():
-            if key_dict == key:
-                vals.append(val)
-                fillkey = True
-        if not fillkey:
-            vals.append(0)
-
-    return cols, vals
-
-
-def draw_graph(catalog: str, ts_dict: str, keys: list, name: str, title: str, out_dir: str, max_samples: int):
+def draw_graph(catalog: str, series: MetricsSeries, keys: list, name: str, title: str, out_dir: str,
+               max_samples: int):
     fig, ax = plt.subplots()
     plt.xticks(rotation=90)
 
     ax.set_title(f"{name}-{catalog}-{title}")
+    x = series.labels(max_samples)
     for key in keys:
-        x, y = get_x_y(key, ts_dict, max_samples)
-        ax.plot(x, y)
+        ax.plot(x, series.series(key, max_samples))
         ax.legend(keys)
 
     # after plotting the data, format the labels
@@ -145,15 +44,64 @@ def draw_graph(catalog: str, ts_dict: str, keys: list, name: str, title: str, ou
     plt.close()
 
 
-def grep_slog_files(node, slog_files, grep_str: str, file, start_time, end_time):
-    print_node(node, file)
-    for slog in slog_files:
-        for line in slog.split('\n'):
-            if re.search(grep_str, line):
-                logtime = time.mktime(datetime.datetime.strptime(line.split('Z')[0], "%Y-%m-%dT%H:%M:%S.%f").timetuple())  # 2022-02-08T06:39:23.787Z
-                if logtime < start_time or logtime > end_time:
-                    continue
-                file.write(f"{line}\n")
+def dump_parsed(parsed: Tuple[dict, List[str], List[str]]) -> bytes:
+    catalogs, audit_lines, error_lines = parsed
+    return json.dumps({"catalogs": {catalog: series.to_dict() for catalog, series in catalogs.items()},
+                       "audit": audit_lines, "error": error_lines}).encode()
+
+
+def load_parsed(data: bytes) -> Tuple[dict, List[str], List[str]]:
+    parsed = json.loads(data)
+    catalogs = {catalog: MetricsSeries.from_dict(series) for catalog, series in parsed["catalogs"].items()}
+    return catalogs, parsed["audit"], parsed["error"]
+
+
+class ByteBudget:
+    """
+    Bounds the bytes of the slogs spooled to disk and not parsed yet, a slog larger than the budget gets all of it
+    """
+
+    def __init__(self, max_bytes: int):
+        self.__max_bytes = max_bytes
+        self.__available = max_bytes
+        self.__condition = Condition()
+
+    def acquire(self, size: int) -> int:
+        size = min(size, self.__max_bytes)
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__available >= size)
+            self.__available -= size
+        return size
+
+    def release(self, size: int) -> None:
+        with self.__condition:
+            self.__available += size
+            self.__condition.notify_all()
+
+
+class ParsePool:
+    """
+    Pool of parsing processes started on the first submit, runs with every parsed result cached don't start any
+    """
+
+    def __init__(self, max_workers: int):
+        self.__max_workers = max_workers
+        self.__executor = None
+        self.__lock = Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        with self.__lock:
+            if self.__executor is None:
+                # spawned, forking while downloading threads hold locks isn't safe
+                self.__executor = ProcessPoolExecutor(max_workers=self.__max_workers, mp_context=get_context("spawn"))
+        return self.__executor.submit(fn, *args)
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.__executor is not None:
+            self.__executor.shutdown()
 
 
 def print_node(folder, file):
@@ -162,12 +110,12 @@ def print_node(folder, file):
     file.write("---------------------------------------------\n")
 
 
-def show_metrics(call_config, files, start_time, end_time, out_dir, node_title):
-    json_dicts = get_slog_metrics(files, call_config["granularity_minutes"], start_time, end_time, call_config["delta_metrics"])
+def show_metrics(call_config, metrics: SlogMetrics, out_dir, node_title):
+    catalogs = metrics.resample(call_config["granularity_minutes"])
     for name, vals in call_config["graphs_keys"].items():
         if name in call_config["graphs"]:
-            for catalog, dict_ts in json_dicts.items():
-                draw_graph(catalog, dict_ts, vals, name, node_title, out_dir, call_config["max_samples"])
+            for catalog, series in catalogs.items():
+                draw_graph(catalog, series, vals, name, node_title, out_dir, call_config["max_samples"])
 
 
 def run(config_json: str):
@@ -192,24 +140,84 @@ def run(config_json: str):
     if audit:
         file_audit = open(f"{out_dir}/audit.log", 'w')
 
-    cluster_files = []
-    for folder in s3location.glob_folders():
-        echo(folder)
-        node = f"{str(folder).split('/')[-2]}"
-        slog_files = []
-        for slog in (folder / 'server*').glob():
-            text_file = slog.download_text()
-            slog_files.append(text_file)
-            cluster_files.append(text_file)
-
-        if audit:
-            grep_slog_files(node, slog_files, "AUDIT", file_audit, start_time, end_time)
-        if error:
-            grep_slog_files(node, slog_files, "ERROR", file_error, start_time, end_time)
-
-        if call_config["each_node"]:
-            show_metrics(call_config, slog_files, start_time, end_time, out_dir, node)
+    # slogs are parsed into buckets of the resolution, resampled to the granularity when drawn
+    resolution = resolution_minutes(call_config["granularity_minutes"])
+
+    def new_metrics() -> SlogMetrics:
+        return SlogMetrics(resolution, start_time, end_time, call_config["delta_metrics"])
+
+    budget = ByteBudget(call_config.get("max_in_flight_mb", 1024) * 1024 * 1024)
+    parsers = ParsePool(max_workers=call_config.get("parse_processes", os.cpu_count()))
+    downloads = ThreadPoolExecutor(max_workers=call_config.get("download_threads", 16))
+
+    # slogs are cached by ETag, and so are their parsed results for the same parse parameters
+    cache = DiskCache(Paths.cache_path, call_config.get("cache_max_mb", 10240) * 1024 * 1024) \
+        if call_config.get("use_cache", True) else None
+    parse_params = json.dumps([resolution, start_time, end_time, call_config["delta_metrics"], audit, error])
+
+    # slogs are downloaded to files the parsing processes read, removed once parsed
+    spool = TemporaryDirectory(prefix="vtm-call-home-")
+
+    def download_and_parse(slog: S3URL) -> Future:
+        object_key = f"objects/{slog.bucket}/{slog.path}/{slog.etag}"
+        parsed_key = f"series/{object_key}/{parse_params}"
+        cached = cache.get(parsed_key) if cache else None
+        if cached is not None:
+            parsing = Future()
+            parsing.set_result(load_parsed(cached))
+            return parsing
+        reserved = budget.acquire(slog.size or 0)
+        fd, slog_path = mkstemp(dir=spool.name)
+        os.close(fd)
+
+        def release(_=None) -> None:
+            os.remove(slog_path)
+            budget.release(reserved)
+
+        try:
+            if not (cache and cache.get_file(object_key, slog_path)):
+                slog.download_file(slog_path)
+                if cache:
+                    cache.put_file(object_key, slog_path)
+        except Exception:
+            release()
+            raise
+        parsing = parsers.submit(parse_slog, slog_path, slog.url.suffix == ".gz", resolution,
+                                 start_time, end_time, call_config["delta_metrics"], audit, error)
+        parsing.add_done_callback(release)
+        if cache:
+            parsing.add_done_callback(
+                lambda done: cache.put(parsed_key, dump_parsed(done.result())) if done.exception() is None else None)
+        return parsing
+
+    with spool, parsers, downloads:
+        # every slog is downloaded and parsed concurrently, the results are merged in the nodes and slogs order
+        nodes = []
+        for folder in s3location.glob_folders():
+            echo(folder)
+            node = f"{str(folder).split('/')[-2]}"
+            nodes.append((node, [downloads.submit(download_and_parse, slog) for slog in (folder / 'server*').glob()]))
+
+        cluster_metrics = new_metrics()
+        for node, slogs in nodes:
+            node_metrics = new_metrics()
+            if audit:
+                print_node(node, file_audit)
+            if error:
+                print_node(node, file_error)
+            for slog in slogs:
+                catalogs, audit_lines, error_lines = slog.result().result()
+                for line in audit_lines:
+                    file_audit.write(f"{line}\n")
+                for line in error_lines:
+                    file_error.write(f"{line}\n")
+                if call_config["each_node"]:
+                    node_metrics.merge(catalogs)
+                if call_config["all_clusters"]:
+                    cluster_metrics.merge(catalogs)
+
+            if call_config["each_node"]:
+                show_metrics(call_config, node_metrics, out_dir, node)
 
     if call_config["all_clusters"]:
-        show_metrics(call_config, cluster_files, start_time, end_time, out_dir, "all-cluster")
-
+        show_metrics(call_config, cluster_metrics, out_dir, "all-cluster")
@@ -1,10 +1,11 @@
 from __future__ import annotations
 from enum import Enum
 from click import exceptions
-from typing import List, Union
+from threading import Lock
+from typing import List, Tuple, Union
 from .utils import read_file_as_json, logger
 from .constants import Paths, InvalidNodeError, Common
-from pydantic import BaseModel, StrictStr, StrictInt, error_wrappers
+from pydantic import BaseModel, PrivateAttr, StrictStr, StrictInt, StrictFloat, conint, error_wrappers
 
 
 class BrandEnum(str, Enum):
@@ -17,16 +18,36 @@ class RoleEnum(str, Enum):
     worker = 'worker'
 
 
-class DistributionConfiguration(BaseModel):
+class FrozenModel(BaseModel):
+    class Config:
+        frozen = True
+
+
+class DistributionConfiguration(FrozenModel):
     brand: Union[BrandEnum, None]
     port: Union[StrictInt, None]
 
 
-class VaradaConfiguration(BaseModel):
+class VaradaConfiguration(FrozenModel):
     port: Union[StrictInt, None]
 
 
-class Connection(BaseModel):
+class HttpConfiguration(FrozenModel):
+    pool_connections: StrictInt
+    pool_maxsize: StrictInt
+    retries: StrictInt
+    backoff_factor: Union[StrictFloat, StrictInt]
+
+
+class FanoutConfiguration(FrozenModel):
+    # a limit of 0 would block every fan-out forever
+    max_parallel: conint(strict=True, ge=1)
+    max_parallel_per_bastion: conint(strict=True, ge=1)
+    retries: StrictInt
+    backoff_factor: Union[StrictFloat, StrictInt]
+
+
+class Connection(FrozenModel):
     hostname: StrictStr
     port: StrictInt
     username: StrictStr
@@ -36,6 +57,7 @@ class Connection(BaseModel):
     role: RoleEnum
     distribution: DistributionConfiguration
     varada: VaradaConfiguration
+    http: HttpConfiguration
 
     @property
     def with_bastion(self) -> bool:
@@ -54,7 +76,8 @@ class Connection(BaseModel):
     def __str__(self) -> str:
         return repr(self)
 
-class BastionConfiguration(BaseModel):
+
+class BastionConfiguration(FrozenModel):
     hostname: Union[StrictStr, None]
     port: Union[StrictInt, None]
     username: Union[StrictStr, None]
@@ -68,6 +91,16 @@ class Configuration(BaseModel):
     bastion: BastionConfiguration
     distribution: DistributionConfiguration
     varada: VaradaConfiguration
+    http: HttpConfiguration
+    fanout: FanoutConfiguration
+    _coordinator_connection: Connection = PrivateAttr()
+    _workers_connections: Tuple[Connection, ...] = PrivateAttr()
+
+    def __init__(self, **data):
+        super(Configuration, self).__init__(**data)
+        self._coordinator_connection = self._build_connection(hostname=self.coordinator, role=RoleEnum.coordinator)
+        self._workers_connections = tuple(self._build_connection(hostname=node, role=RoleEnum.worker)
+                                          for node in self.workers)
 
     @property
     def is_single(self) -> bool:
@@ -79,6 +112,8 @@ class Configuration(BaseModel):
         bastion_data = data.get("bastion", dict())
         distribution_data = data.get('distribution', dict())
         varada_data = data.get('varada', dict())
+        http_data = data.get('http', dict())
+        fanout_data = data.get('fanout', dict())
         try:
             bastion = BastionConfiguration(
                 hostname=bastion_data.get("hostname"),
@@ -90,6 +125,19 @@ class Configuration(BaseModel):
                 port=distribution_data.get('port', Common.API_PORT)
             )
             varada = VaradaConfiguration(port=varada_data.get('port', Common.VARADA_PORT))
+            http = HttpConfiguration(
+                pool_connections=http_data.get('pool_connections', Common.HTTP_POOL_CONNECTIONS),
+                pool_maxsize=http_data.get('pool_maxsize', Common.HTTP_POOL_MAXSIZE),
+                retries=http_data.get('retries', Common.HTTP_RETRIES),
+                backoff_factor=http_data.get('backoff_factor', Common.HTTP_BACKOFF_FACTOR)
+            )
+            fanout = FanoutConfiguration(
+                max_parallel=fanout_data.get('max_parallel', Common.FANOUT_MAX_PARALLEL),
+                max_parallel_per_bastion=fanout_data.get('max_parallel_per_bastion',
+                                                         Common.FANOUT_MAX_PARALLEL_PER_BASTION),
+                retries=fanout_data.get('retries', Common.FANOUT_RETRIES),
+                backoff_factor=fanout_data.get('backoff_factor', Common.FANOUT_BACKOFF_FACTOR)
+            )
             return cls(
                 coordinator=data.get("coordinator"),
                 workers=data.get("workers"),
@@ -97,7 +145,9 @@ class Configuration(BaseModel):
                 port=data.get("port"),
                 bastion=bastion,
                 distribution=distribution,
-                varada=varada
+                varada=varada,
+                http=http,
+                fanout=fanout
             )
         except error_wrappers.ValidationError as e:
             logger.error(f"Configuration is malformed: {e}")
@@ -109,34 +159,27 @@ class Configuration(BaseModel):
             return 1
         return len(self.workers) + 1
 
-    def iter_workers_connections(self):
-        for node in self.workers:
-            yield Connection(
-                hostname=node,
-                port=self.port,
-                username=self.username,
-                bastion_port=self.bastion.port,
-                bastion_hostname=self.bastion.hostname,
-                bastion_username=self.bastion.username,
-                role=RoleEnum.worker,
-                distribution=self.distribution,
-                varada=self.varada
-            )
-
-    @property
-    def coordinator_connection(self):
+    def _build_connection(self, hostname: str, role: RoleEnum) -> Connection:
         return Connection(
-            hostname=self.coordinator,
+            hostname=hostname,
             port=self.port,
             username=self.username,
             bastion_port=self.bastion.port,
             bastion_hostname=self.bastion.hostname,
             bastion_username=self.bastion.username,
-            role=RoleEnum.coordinator,
+            role=role,
             distribution=self.distribution,
-            varada=self.varada
+            varada=self.varada,
+            http=self.http
         )
 
+    def iter_workers_connections(self):
+        yield from self._workers_connections
+
+    @property
+    def coordinator_connection(self):
+        return self._coordinator_connection
+
     def iter_connections(self) -> Connection:
         yield self.coordinator_connection
         if not self.is_single:
@@ -144,10 +187,8 @@ class Configuration(BaseModel):
 
     def get_connection_by_name(self, node: str) -> Connection:
         if node == "coordinator":
-            role = RoleEnum.coordinator
-            hostname = self.coordinator
+            return self.coordinator_connection
         elif node.startswith("node-"):
-            role = RoleEnum.worker
             _, position = node.split("-")
             if position.isdigit():
                 position = int(position)
@@ -157,21 +198,28 @@ class Configuration(BaseModel):
                 raise InvalidNodeError(
                     f"Worker node out of range, got {node}, but there are only {len(self.workers)} workers"
                 )
-            hostname = self.workers[position]
-        else:
-            raise InvalidNodeError(f"Got invalid node: {node}")
-        return Connection(
-            hostname=hostname,
-            port=self.port,
-            username=self.username,
-            bastion_port=self.bastion.port,
-            bastion_hostname=self.bastion.hostname,
-            bastion_username=self.bastion.username,
-            role=role,
-            distribution=self.distribution,
-            varada=self.varada
-        )
+            return self._workers_connections[position]
+        raise InvalidNodeError(f"Got invalid node: {node}")
+
+
+__configs = {}
+__configs_lock = Lock()
 
 
 def get_config() -> Configuration:
-    return Configuration.from_json(Paths.config_path)
+    """
+    Configuration parsed from the config file, cached until the file is modified
+    """
+    config_path = Paths.config_path
+    try:
+        stat = config_path.stat()
+    except FileNotFoundError:
+        # let the reading fail the usual way
+        return Configuration.from_json(config_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with __configs_lock:
+        cached = __configs.get(config_path)
+        if cached is None or cached[0] != version:
+            cached = version, Configuration.from_json(config_path)
+            __configs[config_path] = cached
+    return cached[1]
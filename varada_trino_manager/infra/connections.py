@@ -1,27 +1,35 @@
-from os import makedirs
 from copy import deepcopy
+from atexit import register
+from csv import writer
+from json import dumps
+from time import monotonic, time
 from .utils import logger
 from getpass import getuser
-from typing import Tuple, Union
+from select import select
+from typing import Tuple, Union, TextIO, Callable, Iterator
 from dataclasses import dataclass
-from os.path import exists, dirname
+from collections import defaultdict
+from threading import local, Lock
+from importlib import import_module
 from abc import ABCMeta, abstractmethod
-from sshtunnel import SSHTunnelForwarder
+from paramiko.channel import Channel
 from paramiko.transport import Transport
+from paramiko.agent import AgentRequestHandler
 from paramiko.sftp_client import SFTPClient
 from paramiko import AutoAddPolicy, SSHClient
-from .configuration import Connection, BrandEnum
-from trino.dbapi import Connection as TrinoConnection
+from .bastion import bastion_sessions
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .configuration import Connection, BrandEnum, HttpConfiguration
 from requests import Session, Response, codes, exceptions
-from prestodb.dbapi import Connection as PrestoConnection
 
 
 class Client(metaclass=ABCMeta):
     def __init__(self, con: Connection, port: int):
         self.__con = con
+        self.__remote_port = port
         self.__port = port
         self.__host = con.hostname
-        self.__tuneel = None
 
     @property
     def host(self):
@@ -33,24 +41,14 @@ class Client(metaclass=ABCMeta):
 
     def __enter__(self):
         if self.__con.with_bastion:
-            self.__tuneel = SSHTunnelForwarder(
-                ssh_address_or_host=(
-                    self.__con.bastion_hostname,
-                    self.__con.bastion_port,
-                ),
-                ssh_username=self.__con.bastion_username,
-                remote_bind_address=(self.__con.hostname, self.port),
-                allow_agent=True,
-            )
-            self.__tuneel.start()
-            self.__host, self.__port = self.__tuneel.local_bind_address
+            # all the clients share a single connection to the bastion, see BastionSession
+            self.__host, self.__port = bastion_sessions.get(con=self.__con).forward(
+                hostname=self.__con.hostname, port=self.__remote_port)
         self.connect()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
-        if self.__con.with_bastion:
-            self.__tuneel.stop()
 
     @abstractmethod
     def connect(self):
@@ -67,6 +65,8 @@ class Client(metaclass=ABCMeta):
 class SSH(Client):
     PORT = 22
     LOCALHOST: str = "127.0.0.1"
+    BUFFER_SIZE = 32 * 1024
+    POLL_INTERVAL = 0.1
 
     def __init__(self, con: Connection):
         super(SSH, self).__init__(con=con, port=con.port)
@@ -88,24 +88,113 @@ class SSH(Client):
     def get_transport(self) -> Transport:
         return self.__client.get_transport()
 
+    @property
+    def is_active(self) -> bool:
+        transport = self.get_transport()
+        return transport is not None and transport.is_active()
+
+    def open_sftp(self) -> SFTPClient:
+        return SFTPClient.from_transport(self.get_transport())
+
     def execute(self, command: str) -> str:
         logger.debug(f"<{self.host}>Executing: {command}")
         _, stdout, _ = self.__client.exec_command(command=command)
         return stdout.read().decode()
 
+    def open_command(self, command: str) -> Channel:
+        """
+        Execute command on a new channel, its output can be read while it is produced with channel.makefile("rb")
+        """
+        logger.debug(f"<{self.host}>Executing: {command}")
+        channel = self.get_transport().open_session()
+        channel.exec_command(command=command)
+        return channel
+
+    def stream(self, command: str, on_line: Callable[[str, bool], None], forward_agent: bool = False) -> int:
+        """
+        Execute command, calling on_line(line, is_stderr) for every output line as soon as it arrives,
+        returns the command's exit code. With forward_agent the command can authenticate with the local ssh agent
+        """
+        logger.debug(f"<{self.host}>Streaming: {command}")
+        channel = self.get_transport().open_session()
+        agent_handler = AgentRequestHandler(channel) if forward_agent else None
+        try:
+            channel.exec_command(command=command)
+            buffers = {False: b"", True: b""}
+            streams = {
+                False: (channel.recv_ready, channel.recv),
+                True: (channel.recv_stderr_ready, channel.recv_stderr),
+            }
+            while True:
+                received = False
+                for is_stderr, (ready, recv) in streams.items():
+                    if not ready():
+                        continue
+                    received = True
+                    *lines, buffers[is_stderr] = (buffers[is_stderr] + recv(self.BUFFER_SIZE)).split(b"\n")
+                    for line in lines:
+                        on_line(line.decode(errors="replace"), is_stderr)
+                if received:
+                    continue
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                select([channel], [], [], self.POLL_INTERVAL)
+            for is_stderr, remaining in buffers.items():
+                if remaining:
+                    on_line(remaining.decode(errors="replace"), is_stderr)
+            return channel.recv_exit_status()
+        finally:
+            if agent_handler is not None:
+                agent_handler.close()
+            channel.close()
+
+
+class SSHPool:
+    """
+    Process wide pool of connected SSH clients, one per node. Commands and SFTP sessions are opened as channels
+    over the node's transport, instead of a new connection and key exchange per operation
+    """
+
+    def __init__(self):
+        self.__clients = {}
+        self.__lock = Lock()
+        self.__node_locks = defaultdict(Lock)
+
+    @staticmethod
+    def __key(con: Connection) -> tuple:
+        return con.hostname, con.port, con.username, con.bastion_hostname, con.bastion_port, con.bastion_username
+
+    def get(self, con: Connection) -> SSH:
+        key = self.__key(con)
+        with self.__lock:
+            node_lock = self.__node_locks[key]
+        with node_lock:
+            client = self.__clients.get(key)
+            if client is None or not client.is_active:
+                if client is not None:
+                    logger.debug(f"Reconnecting {con}, pooled connection is no longer active")
+                    self.__close_client(client)
+                client = SSH(con=con).__enter__()
+                self.__clients[key] = client
+            return client
+
+    @staticmethod
+    def __close_client(client: SSH) -> None:
+        try:
+            client.__exit__(None, None, None)
+        except Exception:
+            logger.debug(f"Failed closing connection to {client.connection}", exc_info=True)
 
-class SFTP(SSH):
-    def connect(self):
-        super(SFTP, self).connect()
-        self.__client = SFTPClient.from_transport(self.get_transport())
+    def close(self) -> None:
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients.clear()
+        for client in clients:
+            self.__close_client(client)
 
-    def get(self, remote_file_path: str, local_file_path: str):
-        if not exists(dirname(local_file_path)):
-            makedirs(dirname(local_file_path))
-        self.__client.get(remotepath=remote_file_path, localpath=local_file_path)
 
-    def put(self, local_file_path: str, remote_file_path: str):
-        self.__client.put(localpath=local_file_path, remotepath=remote_file_path)
+ssh_pool = SSHPool()
+register(ssh_pool.close)
 
 
 @dataclass
@@ -124,17 +213,56 @@ def handle_response(func):
     return handle_response_wrapper
 
 
+class HttpSessions:
+    """
+    Process wide requests sessions shared by all the Rest clients, keeping per host keep-alive connection pools
+    """
+    RETRY_STATUSES = [502, 503, 504]
+
+    def __init__(self):
+        self.__sessions = {}
+        self.__lock = Lock()
+
+    def get(self, config: HttpConfiguration) -> Session:
+        key = (config.pool_connections, config.pool_maxsize, config.retries, config.backoff_factor)
+        with self.__lock:
+            session = self.__sessions.get(key)
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=config.pool_connections,
+                    pool_maxsize=config.pool_maxsize,
+                    max_retries=Retry(total=config.retries, backoff_factor=config.backoff_factor,
+                                      status_forcelist=self.RETRY_STATUSES, raise_on_status=False),
+                )
+                session = Session()
+                session.mount(f"{Schemas.HTTP}://", adapter)
+                session.mount(f"{Schemas.HTTPS}://", adapter)
+                self.__sessions[key] = session
+            return session
+
+    def close(self) -> None:
+        with self.__lock:
+            for session in self.__sessions.values():
+                session.close()
+            self.__sessions.clear()
+
+
+http_sessions = HttpSessions()
+register(http_sessions.close)
+
+
 class Rest(Client):
     def __init__(self, con: Connection, http_schema: str = Schemas.HTTP, port: int = None):
         super(Rest, self).__init__(con=con, port=port)
         self.__http_schema = http_schema
+        self.__client = None
 
     def connect(self):
-        self.__client = Session()
+        self.__client = http_sessions.get(config=self.connection.http)
 
     def close(self) -> None:
-        if self.__client is not None:
-            del self.__client
+        # the session is shared, only drop the reference
+        self.__client = None
 
     @property
     def url(self) -> str:
@@ -225,11 +353,73 @@ class VaradaWarmingRest(Rest):
         return status.json()
 
 
+class HttpCounter:
+    """
+    Response hook counting the HTTP round trips and bytes received by a requests session
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+
+    def __call__(self, response: Response, *args, **kw) -> None:
+        self.requests += 1
+        self.bytes += len(response.content or b"")
+
+
+class QueryTimer:
+    """
+    Client side measurements of a single query: submit time, first and last row times, HTTP round trips and
+    bytes received
+    """
+
+    def __init__(self, http_counter: HttpCounter):
+        self.__http_counter = http_counter
+        self.__requests = http_counter.requests
+        self.__bytes = http_counter.bytes
+        self.__submit_timestamp = time()
+        self.__start = monotonic()
+        self.__submitted = None
+        self.__first_row = None
+        self.__last_row = None
+        self.__rows = 0
+
+    def submitted(self) -> None:
+        self.__submitted = monotonic()
+
+    def fetched(self, rows: int) -> None:
+        now = monotonic()
+        if rows and self.__first_row is None:
+            self.__first_row = now
+        if rows:
+            self.__last_row = now
+        self.__rows += rows
+
+    def stats(self, stats: dict) -> dict:
+        end = monotonic()
+        stats = dict(stats)
+        total_millis = round((end - self.__start) * 1000)
+        stats["client"] = {
+            "submitTimestamp": round(self.__submit_timestamp * 1000),
+            "submitMillis": round(((self.__submitted or end) - self.__start) * 1000),
+            "timeToFirstRowMillis": round(((self.__first_row or end) - self.__start) * 1000),
+            "timeToLastRowMillis": round(((self.__last_row or end) - self.__start) * 1000),
+            "totalMillis": total_millis,
+            "overheadMillis": max(total_millis - stats.get("elapsedTimeMillis", 0), 0),
+            "rows": self.__rows,
+            "httpRequests": self.__http_counter.requests - self.__requests,
+            "bytesReceived": self.__http_counter.bytes - self.__bytes,
+        }
+        return stats
+
+
 class APIClient(Client):
+    BATCH_SIZE = 1000
 
-    distribution_to_class = {
-        BrandEnum.trino: TrinoConnection,
-        BrandEnum.presto: PrestoConnection
+    # DBAPI modules are imported on connect, commands not running queries don't pay for importing them
+    distribution_to_module = {
+        BrandEnum.trino: "trino.dbapi",
+        BrandEnum.presto: "prestodb.dbapi"
     }
 
     def __init__(
@@ -243,30 +433,113 @@ class APIClient(Client):
         self.__catalog = catalog
 
     def connect(self):
-        cls = self.distribution_to_class.get(self.connection.distribution.brand)
-        if cls is None:
+        module_name = self.distribution_to_module.get(self.connection.distribution.brand)
+        if module_name is None:
             raise ValueError(f'Invalid distribution: {self.connection.distribution.brand}')
-        self.__client = cls(
-            host=self.host,
-            port=self.port,
-            user=self.__username,
-            http_scheme=self.__http_schema,
-            http_headers={},
-            session_properties=self.__session_properties,
-            catalog=self.__catalog
-        )
+        self.__cls = import_module(module_name).Connection
+        # DBAPI connections are not thread safe, every thread using this client gets its own connection which
+        # is kept open (and its HTTP session alive) until the client is closed
+        self.__local = local()
+        self.__lock = Lock()
+        self.__connections = []
+
+    @property
+    def _dbapi_connection(self):
+        con = getattr(self.__local, "connection", None)
+        if con is None:
+            con = self.__cls(
+                host=self.host,
+                port=self.port,
+                user=self.__username,
+                http_scheme=self.__http_schema,
+                http_headers={},
+                session_properties=self.__session_properties,
+                catalog=self.__catalog
+            )
+            self.__local.connection = con
+            self.__local.http_counter = HttpCounter()
+            con._http_session.hooks["response"].append(self.__local.http_counter)
+            with self.__lock:
+                self.__connections.append(con)
+        return con
 
     def close(self):
-        del self.__client
+        with self.__lock:
+            for con in self.__connections:
+                con.close()
+            self.__connections.clear()
+        self.__local = local()
+
+    @staticmethod
+    def __fetch_batches(cursor, timer: QueryTimer, batch_size: int) -> Iterator[list]:
+        """
+        The result set in batches, the first row is fetched alone: fetchmany polls until a whole batch arrived, so
+        timing the first batch would measure the time to the batch_size-th row
+        """
+        row = cursor.fetchone()
+        if row is None:
+            return
+        timer.fetched(rows=1)
+        yield [row]
+        for batch in iter(lambda: cursor.fetchmany(batch_size), []):
+            timer.fetched(rows=len(batch))
+            yield batch
 
     def execute(self, query: str, fetch_all: bool = True) -> Tuple[list, dict]:
+        """
+        Execute a query, the returned stats are extended with client side measurements under "client"
+        """
+        try:
+            logger.debug(f"Executing: {query.encode()}")
+            cursor = self._dbapi_connection.cursor()
+            timer = QueryTimer(http_counter=self.__local.http_counter)
+            cursor.execute(query)
+            timer.submitted()
+            if fetch_all:
+                result = []
+                for batch in self.__fetch_batches(cursor=cursor, timer=timer, batch_size=self.BATCH_SIZE):
+                    result.extend(batch)
+            else:
+                result = cursor.fetchone()
+                timer.fetched(rows=0 if result is None else 1)
+            return result, timer.stats(cursor.stats)
+        except Exception as e:
+            logger.exception(f"Failed to execute query: {query}")
+            raise e
+
+    def execute_streaming(self, query: str, fd: TextIO = None, results_format: str = "jsonl",
+                          batch_size: int = BATCH_SIZE, preview_rows: int = 10) -> Tuple[list, dict]:
+        """
+        Execute a query iterating the result set in batches, rows are written to fd (jsonl or csv) as they arrive
+        and only the first preview_rows are kept in memory
+        """
         try:
             logger.debug(f"Executing: {query.encode()}")
-            with self.__client as con:
-                cursor = con.cursor()
-                cursor.execute(query)
-                result = cursor.fetchall() if fetch_all else cursor.fetchone()
-            return result, cursor.stats
+            cursor = self._dbapi_connection.cursor()
+            timer = QueryTimer(http_counter=self.__local.http_counter)
+            cursor.execute(query)
+            timer.submitted()
+            preview = []
+            csv_writer = writer(fd) if fd is not None and results_format == "csv" else None
+            # the columns may only be known once the first rows (or the end of an empty result set) arrive
+            with_header = csv_writer is not None and cursor.description is not None
+            if with_header:
+                csv_writer.writerow([column[0] for column in cursor.description])
+            for batch in self.__fetch_batches(cursor=cursor, timer=timer, batch_size=batch_size):
+                if len(preview) < preview_rows:
+                    preview.extend(batch[:preview_rows - len(preview)])
+                if fd is None:
+                    continue
+                if csv_writer is not None:
+                    if not with_header:
+                        csv_writer.writerow([column[0] for column in cursor.description or []])
+                        with_header = True
+                    csv_writer.writerows(batch)
+                else:
+                    fd.writelines(f"{dumps(row, default=str)}\n" for row in batch)
+            if csv_writer is not None and not with_header:
+                csv_writer.writerow([column[0] for column in cursor.description or []])
+            return preview, timer.stats(cursor.stats)
         except Exception as e:
             logger.exception(f"Failed to execute query: {query}")
             raise e
@@ -8,12 +8,22 @@ class InvalidNodeError(Exception):
     pass
 
 
+class RelayError(Exception):
+    pass
+
+
+class RemoteCommandError(Exception):
+    pass
+
+
 @dataclass
 class Paths:
     config_dir: Path = Path(environ.get("VARADA_TRINO_MANAGER_DIR", expanduser("~/.vtm")))
     config_file_name: str = "config.json"
     config_path: Path = config_dir / config_file_name
     logs_path: Path = config_dir / "logs"
+    logs_state_path: Path = config_dir / "logs_state.json"
+    cache_path: Path = config_dir / "cache"
 
 
 class Common:
@@ -21,3 +31,12 @@ class Common:
     SSH_ARGS_AGENT_FORWARDING = f"{SSH_ARGS} -A -tt"
     API_PORT = 8080
     VARADA_PORT = 8088
+    HTTP_POOL_CONNECTIONS = 256
+    HTTP_POOL_MAXSIZE = 32
+    HTTP_RETRIES = 3
+    HTTP_BACKOFF_FACTOR = 0.5
+    FANOUT_MAX_PARALLEL = 32
+    FANOUT_MAX_PARALLEL_PER_BASTION = 8
+    FANOUT_RETRIES = 2
+    FANOUT_BACKOFF_FACTOR = 1
+    TRANSFER_CHUNK_SIZE = 1024 * 1024
@@ -0,0 +1,119 @@
+from hashlib import sha256
+from threading import Lock
+from pathlib import Path
+from operator import itemgetter
+from tempfile import NamedTemporaryFile
+from typing import Callable, IO, List, Optional, Tuple
+from os import replace, scandir, utime, remove
+from os.path import getsize
+from .utils import logger
+from .constants import Common
+from shutil import copyfile, copyfileobj
+
+TMP_SUFFIX = ".tmp"
+
+
+class DiskCache:
+    """
+    Content cache in a local dir, entries are files named by the hash of their key. Reading an entry marks it as
+    recently used, and once the cache grows over max_bytes the least recently used entries are evicted. The size is
+    kept as a running total, the dir is only scanned when evicting
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.__path = Path(path)
+        self.__max_bytes = max_bytes
+        self.__lock = Lock()
+        self.__path.mkdir(parents=True, exist_ok=True)
+        self.__size = sum(size for _, size, _ in self.__entries())
+
+    def __entry_path(self, key: str) -> Path:
+        return self.__path / sha256(key.encode()).hexdigest()
+
+    def __entries(self) -> List[Tuple[str, int, float]]:
+        """
+        (path, size, modification time) of every entry
+        """
+        entries = []
+        for entry in scandir(self.__path):
+            if not entry.is_file() or entry.name.endswith(TMP_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted meanwhile
+            entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry_path = self.__entry_path(key)
+        try:
+            data = entry_path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            utime(entry_path)
+        except FileNotFoundError:
+            pass  # evicted meanwhile
+        return data
+
+    def get_file(self, key: str, file_path: str) -> bool:
+        """
+        Copy the entry to file_path, False if there is no such entry
+        """
+        entry_path = self.__entry_path(key)
+        try:
+            copyfile(entry_path, file_path)
+        except FileNotFoundError:
+            return False
+        try:
+            utime(entry_path)
+        except FileNotFoundError:
+            pass  # evicted meanwhile
+        return True
+
+    def __write(self, key: str, write: Callable[[IO[bytes]], None]) -> None:
+        entry_path = self.__entry_path(key)
+        # a temp file per writer, so concurrent writers of a key never write into the same file
+        with NamedTemporaryFile(dir=self.__path, suffix=TMP_SUFFIX, delete=False) as tmp_file:
+            try:
+                write(tmp_file)
+            except BaseException:
+                tmp_file.close()
+                remove(tmp_file.name)
+                raise
+        size = getsize(tmp_file.name)
+        try:
+            replaced_size = getsize(entry_path)
+        except FileNotFoundError:
+            replaced_size = 0
+        replace(tmp_file.name, entry_path)
+        with self.__lock:
+            self.__size += size - replaced_size
+            evict = self.__size > self.__max_bytes
+        if evict:
+            self.__evict()
+
+    def put(self, key: str, data: bytes) -> None:
+        self.__write(key, lambda tmp_file: tmp_file.write(data))
+
+    def put_file(self, key: str, file_path: str) -> None:
+        def write(tmp_file: IO[bytes]) -> None:
+            with open(file_path, "rb") as f:
+                copyfileobj(f, tmp_file, Common.TRANSFER_CHUNK_SIZE)
+        self.__write(key, write)
+
+    def __evict(self) -> None:
+        with self.__lock:
+            entries = self.__entries()
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for entry_path, entry_size, _ in sorted(entries, key=itemgetter(2)):
+                if size <= self.__max_bytes:
+                    break
+                logger.debug(f"Evicting {entry_path} from {self.__path}")
+                size -= entry_size
+                try:
+                    remove(entry_path)
+                except FileNotFoundError:
+                    pass
+            self.__size = size
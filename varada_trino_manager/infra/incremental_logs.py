@@ -0,0 +1,100 @@
+from os import makedirs, replace
+from json import dump
+from shlex import quote
+from typing import Dict, Tuple
+from .utils import logger, read_file_as_json
+from .constants import Paths, Common
+from .connections import ssh_pool
+from .remote import FanOut, ssh_execute
+from .configuration import get_config, Connection
+from os.path import abspath, exists, join as path_join
+
+REMOTE_LOGS_DIR = "/var/log/presto"
+
+
+def load_state() -> dict:
+    """
+    Collected offsets per destination dir, node and log file
+    """
+    if not exists(Paths.logs_state_path):
+        return {}
+    return read_file_as_json(file_path=Paths.logs_state_path)
+
+
+def save_state(state: dict) -> None:
+    tmp_path = f"{Paths.logs_state_path}.tmp"
+    with open(tmp_path, "w") as fd:
+        dump(state, fd, indent=2)
+    replace(tmp_path, Paths.logs_state_path)
+
+
+def list_remote_files(con: Connection, remote_dir: str) -> Dict[str, Tuple[int, int]]:
+    """
+    inode and size per file name in remote_dir
+    """
+    output = ssh_execute(command=f"find {quote(remote_dir)} -maxdepth 1 -type f -printf '%i %s %f\\n'", con=con)
+    files = {}
+    for line in output.splitlines():
+        inode, size, name = line.split(" ", 2)
+        files[name] = int(inode), int(size)
+    return files
+
+
+def fetch_new_bytes(con: Connection, local_dir_path: str, state: dict) -> dict:
+    """
+    Append the bytes written to the node's log files since the offsets in state to the local copies,
+    returns the node's updated state
+    """
+    node_dir_path = path_join(local_dir_path, f"{con.role}-{con.hostname}")
+    makedirs(node_dir_path, exist_ok=True)
+    new_state = {}
+    fetched = 0
+    with ssh_pool.get(con=con).open_sftp() as client:
+        for name, (inode, size) in list_remote_files(con=con, remote_dir=REMOTE_LOGS_DIR).items():
+            local_file_path = path_join(node_dir_path, name)
+            previous = state.get(name, {})
+            offset = previous.get("offset", 0)
+            if previous.get("inode") != inode or size < offset or not exists(local_file_path):
+                # a new, rotated or truncated file, or the local copy is gone
+                offset = 0
+            if size > offset or not exists(local_file_path):
+                with client.open(f"{REMOTE_LOGS_DIR}/{name}", "rb") as remote_file, \
+                        open(local_file_path, "ab" if offset else "wb") as local_file:
+                    remote_file.seek(offset)
+                    remote_file.prefetch(size)
+                    # the file may grow while it is read, stop at the listed size
+                    while offset < size:
+                        chunk = remote_file.read(min(Common.TRANSFER_CHUNK_SIZE, size - offset))
+                        if not chunk:
+                            break
+                        local_file.write(chunk)
+                        offset += len(chunk)
+                        fetched += len(chunk)
+            new_state[name] = {"inode": inode, "offset": offset}
+    logger.info(f"{con.hostname}: fetched {fetched} new bytes of {len(new_state)} log files")
+    return new_state
+
+
+def collect_incremental(local_dir_path: str) -> None:
+    """
+    Fetch only what was appended to the nodes' log files since the last incremental collection to local_dir_path,
+    rotated and truncated files are fetched again from their start
+    """
+    state = load_state()
+    dir_state = state.setdefault(abspath(local_dir_path), {})
+    connections = list(get_config().iter_connections())
+    with FanOut(description="Collecting new log lines", total=len(connections), log_errors=True,
+                connect=ssh_pool.get) as fanout:
+        tasks = [
+            (
+                fanout.submit(fetch_new_bytes, con=con, local_dir_path=local_dir_path,
+                              state=dir_state.get(con.hostname, {})),
+                con.hostname,
+            )
+            for con in connections
+        ]
+    for task, hostname in tasks:
+        # a failed node keeps its previous offsets
+        if task.result() is not None:
+            dir_state[hostname] = task.result()
+    save_state(state=state)
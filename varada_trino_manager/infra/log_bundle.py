@@ -0,0 +1,74 @@
+from typing import Dict
+from .utils import logger
+from dataclasses import dataclass
+from os.path import join as path_join
+from .configuration import get_config
+from .connections import ssh_pool
+from .remote import FanOut, download_output
+
+
+@dataclass
+class Codec:
+    compress_command: str
+    extension: str
+    tar_mode: str = None
+
+    @property
+    def extractable(self) -> bool:
+        return self.tar_mode is not None
+
+
+CODECS: Dict[str, Codec] = {
+    "gzip": Codec(compress_command="gzip -c", extension="tar.gz", tar_mode="gz"),
+    # multi threaded gzip, falls back to gzip on nodes without pigz
+    "pigz": Codec(compress_command="$(command -v pigz || command -v gzip) -c", extension="tar.gz", tar_mode="gz"),
+    # tarfile can't read zstd, so these bundles are only saved
+    "zstd": Codec(compress_command="zstd -T0 -q -c", extension="tar.zst"),
+    "none": Codec(compress_command="", extension="tar", tar_mode=""),
+}
+
+PREPARE_COMMANDS = [
+    "sudo rm -rf /tmp/custom_logs",
+    "mkdir /tmp/custom_logs",
+    "sudo dmesg > /tmp/custom_logs/dmesg",
+    "sudo jps > /tmp/custom_logs/jps",
+    'grep TrinoServer /tmp/custom_logs/jps | cut -d" " -f1 > /tmp/custom_logs/server.pid || true',
+    "sudo jstack $(cat /tmp/custom_logs/server.pid) > /tmp/custom_logs/jstack.txt || true",
+]
+
+# the logs are archived in place, tar exits with 1 when a log file is written to while it is read
+TAR_COMMAND = (
+    "(sudo tar --ignore-failed-read -cf - -C /tmp/custom_logs . -C /var/log/presto . "
+    "-C /var/log messages user-data.log || [ $? -eq 1 ])"
+)
+
+
+def bundle_command(codec: Codec) -> str:
+    tar_command = f"{TAR_COMMAND} | {codec.compress_command}" if codec.compress_command else TAR_COMMAND
+    return "\n".join(PREPARE_COMMANDS + [tar_command])
+
+
+def collect_bundle(local_dir_path: str, codec_name: str = "gzip", extract: bool = False) -> None:
+    """
+    Stream a compressed archive of every node's logs straight over SSH to
+    local_dir_path/{role}-{hostname}/custom_logs.{extension}, without writing the archive on the nodes.
+    With extract the archive is also extracted into the node's dir while it is downloaded
+    """
+    codec = CODECS[codec_name]
+    if extract and not codec.extractable:
+        raise ValueError(f"{codec_name} bundles can't be extracted on the fly")
+    command = bundle_command(codec=codec)
+    connections = list(get_config().iter_connections())
+    with FanOut(description="Collecting logs", total=len(connections), log_errors=True,
+                connect=ssh_pool.get) as fanout:
+        for con in connections:
+            node_dir_path = path_join(local_dir_path, f"{con.role}-{con.hostname}")
+            fanout.submit(
+                download_output,
+                con=con,
+                command=command,
+                local_file_path=path_join(node_dir_path, f"custom_logs.{codec.extension}"),
+                extract_dir_path=node_dir_path if extract else None,
+                tar_mode=codec.tar_mode,
+            )
+    logger.info(f"Logs saved to {local_dir_path}")
@@ -0,0 +1,85 @@
+from shlex import quote
+from .utils import logger
+from typing import Iterator, Tuple
+from .configuration import get_config, Connection
+from .connections import ssh_pool
+from .remote import FanOut, ssh_stream
+from .incremental_logs import REMOTE_LOGS_DIR
+from .log_merge import QueueIterator, merge_by_timestamp
+
+# Prints the matching lines in the time window prefixed by their entry's timestamp and a tab, the continuation lines
+# (stack traces) of a matching entry are printed too. The arguments are passed through the environment, so the
+# pattern is used as is, without awk's escape sequences processing. Matches are flushed as they are printed, awk
+# buffers its output otherwise
+AWK_FILTER = r"""
+BEGIN {
+    pattern = ENVIRON["VTM_PATTERN"]
+    since = ENVIRON["VTM_SINCE"]
+    until = ENVIRON["VTM_UNTIL"]
+    ignore_case = ENVIRON["VTM_IGNORE_CASE"] != ""
+    if (ignore_case) pattern = tolower(pattern)
+}
+/^[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T/ {
+    timestamp = $1
+    in_window = (since == "" || timestamp >= since) && (until == "" || timestamp < until)
+    entry_matched = in_window && (ignore_case ? tolower($0) : $0) ~ pattern
+    if (entry_matched) {
+        print timestamp "\t" $0
+        fflush()
+    }
+    next
+}
+in_window && (entry_matched || (ignore_case ? tolower($0) : $0) ~ pattern) {
+    print timestamp "\t" $0
+    fflush()
+}
+"""
+
+
+def grep_command(pattern: str, since: str = None, until: str = None, files: str = "server.log*",
+                 ignore_case: bool = False) -> str:
+    """
+    Command filtering the node's logs (gzipped rotated files included), the files are read oldest first (by
+    modification time) so the output is ordered by timestamp and streamed as matches are found
+    """
+    environment = " ".join([
+        f"VTM_PATTERN={quote(pattern)}",
+        f"VTM_SINCE={quote(since or '')}",
+        f"VTM_UNTIL={quote(until or '')}",
+        f"VTM_IGNORE_CASE={'1' if ignore_case else ''}",
+    ])
+    # files is a glob, left unquoted to be expanded
+    return (f"cd {REMOTE_LOGS_DIR} && ls -1dtr -- {files} 2>/dev/null | "
+            f"while IFS= read -r f; do [ -f \"$f\" ] && zcat -f -- \"$f\"; done | "
+            f"{environment} awk {quote(AWK_FILTER)}")
+
+
+def grep_logs(pattern: str, since: str = None, until: str = None, files: str = "server.log*",
+              ignore_case: bool = False) -> Iterator[Tuple[str, str]]:
+    """
+    Search the logs on all the nodes in parallel, lazily yielding the matching (hostname, line) of all the nodes
+    merged by timestamp while they are streamed back
+    """
+    command = grep_command(pattern=pattern, since=since, until=until, files=files, ignore_case=ignore_case)
+    connections = list(get_config().iter_connections())
+    streams = {con.hostname: QueueIterator() for con in connections}
+
+    def search(con: Connection) -> int:
+        stream = streams[con.hostname]
+
+        def on_line(line: str, is_stderr: bool) -> None:
+            if is_stderr:
+                logger.debug(f"{con.hostname} stderr: {line}")
+            else:
+                timestamp, _, log_line = line.partition("\t")
+                stream.put((timestamp, log_line))
+
+        return ssh_stream(command=command, con=con, on_line=on_line)
+
+    with FanOut(description="Searching logs", total=len(connections), log_errors=True,
+                connect=ssh_pool.get) as fanout:
+        for con in connections:
+            # closed once the search is over
+            fanout.submit(search, con=con).add_done_callback(lambda _, stream=streams[con.hostname]: stream.close())
+        for _, hostname, line in merge_by_timestamp(streams=streams):
+            yield hostname, line
@@ -0,0 +1,69 @@
+from queue import Queue
+from re import compile
+from heapq import merge
+from operator import itemgetter
+from datetime import datetime, timedelta
+from .utils import duration_to_seconds
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Airlift log lines start with an ISO 8601 timestamp, lines without one continue the previous entry
+TIMESTAMP_PATTERN = compile(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?)\s")
+
+
+def line_timestamp(line: str) -> Optional[str]:
+    match = TIMESTAMP_PATTERN.match(line)
+    return match.group(1) if match else None
+
+
+def to_log_timestamp(value: str) -> str:
+    """
+    Log timestamp (UTC) of an ISO timestamp, or of a duration ago such as 30m or 1h30m,
+    comparable as a string with the timestamps in the logs
+    """
+    value = value.strip()
+    try:
+        moment = datetime.utcnow() - timedelta(seconds=duration_to_seconds(value))
+        return f"{moment.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}Z"
+    except ValueError:
+        pass
+    try:
+        datetime.fromisoformat(value.replace(" ", "T").rstrip("Z"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}")
+    return value.replace(" ", "T")
+
+
+class QueueIterator:
+    """
+    Iterates over the items put by another thread, until it is closed
+    """
+    __END = object()
+
+    def __init__(self):
+        self.__queue = Queue()
+
+    def put(self, item) -> None:
+        self.__queue.put(item)
+
+    def close(self) -> None:
+        self.__queue.put(self.__END)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self.__queue.get()
+            if item is self.__END:
+                return
+            yield item
+
+
+def tag_stream(node: str, stream: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str, str]]:
+    for timestamp, line in stream:
+        yield timestamp, node, line
+
+
+def merge_by_timestamp(streams: Dict[str, Iterable[Tuple[str, str]]]) -> Iterator[Tuple[str, str, str]]:
+    """
+    Lazy k-way merge of per node (timestamp, line) streams, each already ordered by timestamp,
+    into (timestamp, node, line) ordered by timestamp. Only the head of every stream is held in memory
+    """
+    return merge(*(tag_stream(node=node, stream=stream) for node, stream in streams.items()), key=itemgetter(0))
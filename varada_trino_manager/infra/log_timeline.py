@@ -0,0 +1,97 @@
+import tarfile
+from .utils import logger
+from os import listdir
+from os.path import basename, exists, isdir, join as path_join
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from .log_merge import line_timestamp, merge_by_timestamp
+
+RUN_QUERY_MARKER = "VTM Run Query: "
+# markers ending the slice of the query runner's current query
+END_MARKERS = (RUN_QUERY_MARKER, "VTM Query Runner Iteration", "VTM Query Runner End")
+BUNDLE_NAMES = ("custom_logs.tar.gz", "custom_logs.tar")
+
+
+def iter_entries(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    (timestamp, line) of every log line, continuation lines (stack traces) get the timestamp of their entry
+    """
+    timestamp = ""
+    for line in lines:
+        line = line.rstrip("\n")
+        timestamp = line_timestamp(line) or timestamp
+        yield timestamp, line
+
+
+def iter_file_lines(file_path: str) -> Iterator[str]:
+    with open(file_path, errors="replace") as fd:
+        yield from fd
+
+
+def iter_bundle_lines(bundle_path: str, file_name: str) -> Iterator[str]:
+    """
+    Lines of file_name read straight from a logs bundle, without extracting it
+    """
+    with tarfile.open(bundle_path, mode="r|*") as tar:
+        for member in tar:
+            if member.isfile() and basename(member.name) == file_name:
+                # TextIOWrapper needs a seekable file, which members of a streamed archive aren't
+                for line in tar.extractfile(member):
+                    yield line.decode(errors="replace")
+                return
+    logger.warning(f"{file_name} not found in {bundle_path}")
+
+
+def node_lines(node_dir_path: str, file_name: str) -> Optional[Iterator[str]]:
+    if exists(path_join(node_dir_path, file_name)):
+        return iter_file_lines(file_path=path_join(node_dir_path, file_name))
+    for bundle_name in BUNDLE_NAMES:
+        if exists(path_join(node_dir_path, bundle_name)):
+            return iter_bundle_lines(bundle_path=path_join(node_dir_path, bundle_name), file_name=file_name)
+    return None
+
+
+def node_streams(logs_dir_path: str, file_name: str = "server.log") -> Dict[str, Iterator[Tuple[str, str]]]:
+    """
+    Lazy (timestamp, line) stream per collected node dir ({role}-{hostname}) in logs_dir_path, read from the
+    extracted file or from the node's logs bundle
+    """
+    streams = {}
+    for node in sorted(listdir(logs_dir_path)):
+        node_dir_path = path_join(logs_dir_path, node)
+        if not isdir(node_dir_path):
+            continue
+        lines = node_lines(node_dir_path=node_dir_path, file_name=file_name)
+        if lines is None:
+            logger.debug(f"No {file_name} in {node_dir_path}")
+            continue
+        streams[node] = iter_entries(lines=lines)
+    return streams
+
+
+def slice_query(timeline: Iterable[Tuple[str, str, str]], query: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    The parts of the timeline from the query runner's marker of query, up to the marker of what it ran next
+    """
+    start_marker = f"{RUN_QUERY_MARKER}{query}"
+    in_slice = False
+    for timestamp, node, line in timeline:
+        if line.rstrip().endswith(start_marker):
+            in_slice = True
+        elif in_slice and any(marker in line for marker in END_MARKERS):
+            in_slice = False
+        if in_slice:
+            yield timestamp, node, line
+
+
+def timeline(logs_dir_path: str, file_name: str = "server.log", query: str = None,
+             markers_only: bool = False) -> Iterator[Tuple[str, str, str]]:
+    """
+    (timestamp, node, line) of all the collected nodes' logs merged by timestamp, streamed without loading the
+    files to memory
+    """
+    merged = merge_by_timestamp(streams=node_streams(logs_dir_path=logs_dir_path, file_name=file_name))
+    if query is not None:
+        merged = slice_query(timeline=merged, query=query)
+    if markers_only:
+        merged = ((timestamp, node, line) for timestamp, node, line in merged if "VTM " in line)
+    return merged
@@ -0,0 +1,120 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class MetricsSeries:
+    """
+    Metrics of one catalog as a keys x time buckets matrix, the buckets are kept in the order they were first seen
+    along with the time of their first sample. Samples are summed per bucket in plain lists and added to the matrix
+    on compact, merging and resampling are vectorised
+    """
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.buckets = np.zeros(0, dtype=np.int64)
+        self.first_seen = np.zeros(0, dtype=np.float64)
+        self.values = np.zeros((0, 0), dtype=np.int64)
+        self.__rows: Dict[str, int] = {}
+        # bucket -> [first sample time, value per key row] of the samples not compacted yet
+        self.__pending: Dict[int, list] = {}
+
+    def __row(self, key: str) -> int:
+        row = self.__rows.get(key)
+        if row is None:
+            row = self.__rows[key] = len(self.keys)
+            self.keys.append(key)
+        return row
+
+    def add(self, bucket: int, timestamp: float, values: Dict[str, int]) -> None:
+        pending = self.__pending.get(bucket)
+        if pending is None:
+            pending = self.__pending[bucket] = [timestamp, []]
+        column = pending[1]
+        for key, val in values.items():
+            row = self.__row(key)
+            if row >= len(column):
+                column.extend([0] * (row + 1 - len(column)))
+            column[row] += val
+
+    def compact(self) -> "MetricsSeries":
+        if self.__pending:
+            pending = MetricsSeries()
+            pending.keys = self.keys
+            pending.buckets = np.fromiter(self.__pending, dtype=np.int64, count=len(self.__pending))
+            pending.first_seen = np.array([first_seen for first_seen, _ in self.__pending.values()], dtype=np.float64)
+            pending.values = np.zeros((len(self.keys), len(self.__pending)), dtype=np.int64)
+            for index, (_, column) in enumerate(self.__pending.values()):
+                pending.values[:len(column), index] = column
+            self.__pending = {}
+            self.merge(pending)
+        return self
+
+    def merge(self, other: "MetricsSeries") -> "MetricsSeries":
+        """
+        Add the buckets of other, the ones not seen yet are appended in their order
+        """
+        self.compact()
+        other.compact()
+        rows = np.array([self.__row(key) for key in other.keys], dtype=np.intp)
+        new = ~np.isin(other.buckets, self.buckets)
+        self.buckets = np.concatenate([self.buckets, other.buckets[new]])
+        self.first_seen = np.concatenate([self.first_seen, other.first_seen[new]])
+        order = np.argsort(self.buckets, kind="stable")
+        columns = order[np.searchsorted(self.buckets, other.buckets, sorter=order)]
+        values = np.zeros((len(self.keys), len(self.buckets)), dtype=np.int64)
+        values[:self.values.shape[0], :self.values.shape[1]] = self.values
+        values[np.ix_(rows, columns)] += other.values
+        self.values = values
+        return self
+
+    def resample(self, factor: int) -> "MetricsSeries":
+        """
+        The series with every factor consecutive buckets summed into one, in the order they were first seen
+        """
+        self.compact()
+        if factor == 1:
+            return self
+        buckets, first_index, inverse = np.unique(self.buckets // factor, return_index=True, return_inverse=True)
+        order = np.argsort(first_index, kind="stable")
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        resampled = MetricsSeries()
+        resampled.keys = list(self.keys)
+        resampled.__rows = dict(self.__rows)
+        resampled.buckets = buckets[order]
+        resampled.first_seen = self.first_seen[first_index[order]]
+        columns = np.zeros((len(buckets), len(self.keys)), dtype=np.int64)
+        np.add.at(columns, position[inverse.reshape(-1)], self.values.T)
+        resampled.values = columns.T
+        return resampled
+
+    def labels(self, max_samples: Optional[int] = None) -> List[str]:
+        self.compact()
+        return [datetime.fromtimestamp(first_seen).strftime('%m/%d/%Y %H:%M')
+                for first_seen in self.first_seen[:max_samples].tolist()]
+
+    def series(self, key: str, max_samples: Optional[int] = None) -> np.ndarray:
+        """
+        The values of key per bucket, 0 where it has no samples
+        """
+        self.compact()
+        row = self.__rows.get(key)
+        if row is None:
+            return np.zeros(len(self.buckets[:max_samples]), dtype=np.int64)
+        return self.values[row, :max_samples]
+
+    def to_dict(self) -> dict:
+        self.compact()
+        return {"keys": self.keys, "buckets": self.buckets.tolist(), "first_seen": self.first_seen.tolist(),
+                "values": self.values.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetricsSeries":
+        series = cls()
+        for key in data["keys"]:
+            series.__row(key)
+        series.buckets = np.array(data["buckets"], dtype=np.int64)
+        series.first_seen = np.array(data["first_seen"], dtype=np.float64)
+        series.values = np.array(data["values"], dtype=np.int64).reshape(len(series.keys), len(series.buckets))
+        return series
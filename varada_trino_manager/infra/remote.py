@@ -1,14 +1,154 @@
 from typing import Union
-from .utils import logger
-from .constants import Common
-from typing import List, Tuple
-from os import execv, makedirs
+from click import echo, exceptions
+from time import sleep
+from re import fullmatch
+from shlex import quote
+from shutil import copyfileobj
+from .utils import logger, file_digests, TeeReader
+from queue import Queue, Empty
+from datetime import datetime
+import tarfile
+from .constants import Common, RelayError, RemoteCommandError
+from os import execv, makedirs, remove
 from traceback import format_exc
+from contextlib import nullcontext
 from subprocess import check_output
-from .configuration import get_config, Connection
-from os.path import basename, dirname, join as path_join
+from threading import Thread, Lock, Semaphore
+from typing import List, Tuple, Callable, Iterable, Optional
+from .configuration import get_config, Connection, FanoutConfiguration
 from concurrent.futures import ThreadPoolExecutor, Future
-from .connections import SSH, SFTP, Rest, APIClient, VaradaRest, ExtendedRest
+from paramiko.sftp_client import SFTPClient
+from os.path import basename, dirname, exists, getsize
+from paramiko import SSHException, AuthenticationException
+from paramiko.ssh_exception import NoValidConnectionsError
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+from .rest_commands import RestCommands
+from .connections import Rest, APIClient, VaradaRest, ExtendedRest, ssh_pool
+
+
+class FanOutLimits:
+    """
+    Process wide limits shared by all the fan-outs running at once: at most max_parallel nodes at once, at most
+    max_parallel_per_bastion of them through the same bastion (see FanoutConfiguration). The semaphores are keyed
+    by the configured limits, so a modified configuration gets new ones
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__parallel = {}
+        self.__bastions = {}
+
+    def parallel(self, config: FanoutConfiguration) -> Semaphore:
+        with self.__lock:
+            if config.max_parallel not in self.__parallel:
+                self.__parallel[config.max_parallel] = Semaphore(config.max_parallel)
+            return self.__parallel[config.max_parallel]
+
+    def bastion(self, con: Connection, config: FanoutConfiguration) -> Union[Semaphore, nullcontext]:
+        if not con.with_bastion:
+            return nullcontext()
+        key = (con.bastion_hostname, con.bastion_port, con.bastion_username, config.max_parallel_per_bastion)
+        with self.__lock:
+            if key not in self.__bastions:
+                self.__bastions[key] = Semaphore(config.max_parallel_per_bastion)
+            return self.__bastions[key]
+
+
+fanout_limits = FanOutLimits()
+
+
+class FanOut:
+    """
+    Runs a function per node on a thread pool, bounded by the process wide FanOutLimits. The connection setup
+    (connect, e.g. ssh_pool.get) is retried with exponential backoff, the function itself runs once since it isn't
+    necessarily safe to run again. The progress is reported for large clusters
+    """
+    PROGRESS_MIN_NODES = 20
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError, NoValidConnectionsError, EOFError, SSHException,
+                        RequestsConnectionError, RequestsTimeout)
+
+    def __init__(self, description: str, total: int, log_errors: bool = False,
+                 connect: Callable[[Connection], object] = None):
+        self.__description = description
+        self.__total = total
+        self.__log_errors = log_errors
+        self.__connect_target = connect
+        self.__config = get_config().fanout
+        self.__lock = Lock()
+        self.__done = 0
+        self.__failed = 0
+        self.__tpx = None
+
+    def __enter__(self):
+        self.__tpx = ThreadPoolExecutor(max_workers=max(min(self.__config.max_parallel, self.__total), 1))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__tpx.shutdown(wait=True)
+        if self.__total >= self.PROGRESS_MIN_NODES:
+            logger.info(f"{self.__description}: done on {self.__done - self.__failed}/{self.__total} nodes, "
+                        f"{self.__failed} failed")
+
+    def __is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, self.RETRYABLE_ERRORS) and not isinstance(error, AuthenticationException)
+
+    def __connect(self, con: Connection) -> None:
+        attempt = 0
+        while True:
+            try:
+                self.__connect_target(con)
+                return
+            except Exception as e:
+                if attempt >= self.__config.retries or not self.__is_retryable(e):
+                    raise
+                delay = self.__config.backoff_factor * 2 ** attempt
+                attempt += 1
+                logger.warning(f"{self.__description}: connecting to {con.hostname} failed: {e!r}, "
+                               f"retry {attempt}/{self.__config.retries} in {delay} seconds")
+                sleep(delay)
+
+    def __attempt(self, target: Callable, con: Connection, kw: dict):
+        with fanout_limits.parallel(self.__config), fanout_limits.bastion(con, self.__config):
+            if self.__connect_target is not None:
+                self.__connect(con)
+            return target(con=con, **kw)
+
+    def __report(self, con: Connection, failed: bool) -> None:
+        with self.__lock:
+            self.__done += 1
+            self.__failed += failed
+            done, failed_count = self.__done, self.__failed
+        logger.debug(f"{self.__description}: {con.hostname} {'failed' if failed else 'done'} ({done}/{self.__total})")
+        step = max(self.__total // 10, 1)
+        if self.__total >= self.PROGRESS_MIN_NODES and done % step == 0 and done < self.__total:
+            logger.info(f"{self.__description}: {done}/{self.__total} nodes, {failed_count} failed")
+
+    def __run(self, target: Callable, con: Connection, kw: dict):
+        failed = False
+        try:
+            return self.__attempt(target=target, con=con, kw=kw)
+        except Exception:
+            failed = True
+            if not self.__log_errors:
+                raise
+            logger.error(f"{self.__description} on {con.hostname} failed:\n{format_exc()}")
+        finally:
+            self.__report(con=con, failed=failed)
+
+    def submit(self, target: Callable, con: Connection, **kw) -> Future:
+        """
+        Schedule target(con=con, **kw), with log_errors a final failure is logged and the result is None,
+        otherwise it is raised by the future
+        """
+        return self.__tpx.submit(self.__run, target, con, kw)
+
+
+def fan_out(target: Callable, connections: Iterable[Connection], description: str, log_errors: bool = False,
+            connect: Callable[[Connection], object] = None, **kw) -> List[Tuple[Future, str]]:
+    connections = list(connections)
+    with FanOut(description=description, total=len(connections), log_errors=log_errors, connect=connect) as fanout:
+        tasks = [(fanout.submit(target, con=con, **kw), con.hostname) for con in connections]
+    return tasks
 
 
 def rest_execute(con: Connection, rest_client_type: Union[Rest, APIClient, ExtendedRest], func, *args, **kw):
@@ -24,23 +164,65 @@ def parallel_rest_execute(rest_client_type: Union[Rest, APIClient, VaradaRest],
         connections = config.iter_workers_connections()
     else:
         connections = config.iter_connections()
-    with ThreadPoolExecutor(max_workers=config.number_of_nodes) as tpx:
-        tasks = [
-            (
-                tpx.submit(rest_execute, con=connection, rest_client_type=rest_client_type, func=func, *args, **kw),
-                connection.hostname,
-            )
-            for connection in connections
-        ]
-    return tasks
+    return fan_out(rest_execute, connections=connections, description=func.__name__,
+                   rest_client_type=rest_client_type, func=func, **kw)
+
+
+class AsyncDevLog:
+    """
+    Ships dev log lines to all the nodes from a background thread, so callers never wait for the fan-out.
+    Lines queued while a batch is being sent are coalesced into a single request per node
+    """
+    MAX_BATCH = 100
+
+    def __init__(self):
+        self.__queue = Queue()
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def log(self, msg: str) -> None:
+        # the lines are sent later, keep the time they were logged at
+        self.__queue.put(f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}Z {msg}")
+
+    def __run(self) -> None:
+        closed = False
+        while not closed:
+            lines = [self.__queue.get()]
+            while len(lines) < self.MAX_BATCH:
+                try:
+                    lines.append(self.__queue.get_nowait())
+                except Empty:
+                    break
+            if None in lines:
+                closed = True
+                lines = [line for line in lines if line is not None]
+            if not lines:
+                continue
+            for future, hostname in parallel_rest_execute(rest_client_type=VaradaRest, func=RestCommands.dev_log,
+                                                          msg="\n".join(lines)):
+                if future.exception() is not None:
+                    logger.debug(f"Failed sending dev log to {hostname}: {future.exception()}")
+
+    def close(self) -> None:
+        """
+        Flush the queued lines and stop the background thread
+        """
+        self.__queue.put(None)
+        self.__thread.join()
 
 
 def ssh_execute(command: str, con: Connection) -> str:
-    try:
-        with SSH(con=con) as client:
-            return client.execute(command=command)
-    except Exception:
-        logger.error(format_exc())
+    return ssh_pool.get(con=con).execute(command=command)
+
+
+def ssh_stream(command: str, con: Connection, on_line: Callable[[str, bool], None], forward_agent: bool = False) -> int:
+    return ssh_pool.get(con=con).stream(command=command, on_line=on_line, forward_agent=forward_agent)
 
 
 def ssh_session(node: str) -> None:
@@ -52,21 +234,107 @@ def ssh_session(node: str) -> None:
     execv(ssh_executable, args.split(" "))
 
 
-def download(con: Connection, remote_file_path: str, local_file_path: str) -> None:
-    logger.debug(f"Copying {con}{remote_file_path} {local_file_path}")
+def remote_sha256(con: Connection, remote_file_path: str, length: int = None) -> Optional[str]:
+    """
+    sha256 hex digest of the remote file, or of its first length bytes, None if it can't be computed
+    """
+    path = quote(remote_file_path)
+    command = f"sha256sum {path}" if length is None else f"head -c {length} {path} | sha256sum"
+    output = ssh_execute(command=command, con=con).split()
+    return output[0] if output and fullmatch(r"[0-9a-f]{64}", output[0]) else None
+
+
+def remote_size(client: SFTPClient, remote_file_path: str) -> Optional[int]:
     try:
-        with SFTP(con=con) as client:
-            return client.get(remote_file_path=remote_file_path, local_file_path=local_file_path)
-    except Exception:
-        logger.error(format_exc())
+        return client.stat(remote_file_path).st_size
+    except IOError:
+        return None
+
+
+def download(con: Connection, remote_file_path: str, local_file_path: str) -> None:
+    """
+    Download remote_file_path, skipped if the local file is already identical and resumed if the local file is a
+    prefix of it (an interrupted download)
+    """
+    makedirs(dirname(local_file_path), exist_ok=True)
+    with ssh_pool.get(con=con).open_sftp() as client:
+        size = client.stat(remote_file_path).st_size
+        local_size = getsize(local_file_path) if exists(local_file_path) else None
+        if local_size == size and file_digests.get(local_file_path) == remote_sha256(con=con, remote_file_path=remote_file_path):
+            logger.debug(f"Skipping {con}{remote_file_path}, {local_file_path} is up to date")
+            return
+        if local_size and local_size < size and file_digests.get(local_file_path) == remote_sha256(
+                con=con, remote_file_path=remote_file_path, length=local_size):
+            logger.debug(f"Resuming {con}{remote_file_path} {local_file_path} from {local_size} bytes")
+            with client.open(remote_file_path, "rb") as remote_file, open(local_file_path, "ab") as local_file:
+                remote_file.seek(local_size)
+                remote_file.prefetch(size)
+                copyfileobj(remote_file, local_file, Common.TRANSFER_CHUNK_SIZE)
+            if file_digests.get(local_file_path) == remote_sha256(con=con, remote_file_path=remote_file_path):
+                return
+            logger.warning(f"Resumed download of {con}{remote_file_path} doesn't match, downloading it again")
+        logger.debug(f"Copying {con}{remote_file_path} {local_file_path}")
+        client.get(remotepath=remote_file_path, localpath=local_file_path)
+
 
 def upload(con: Connection, local_file_path: str, remote_file_path: str) -> None:
-    logger.debug(f"Copying {con}{local_file_path} {remote_file_path}")
+    """
+    Upload local_file_path, skipped if the remote file is already identical and resumed if the remote file is a
+    prefix of it (an interrupted upload)
+    """
+    size = getsize(local_file_path)
+    with ssh_pool.get(con=con).open_sftp() as client:
+        current_size = remote_size(client=client, remote_file_path=remote_file_path)
+        if current_size == size and file_digests.get(local_file_path) == remote_sha256(con=con, remote_file_path=remote_file_path):
+            logger.debug(f"Skipping {local_file_path}, {con}{remote_file_path} is up to date")
+            return
+        if current_size and current_size < size and file_digests.get(
+                local_file_path, length=current_size) == remote_sha256(con=con, remote_file_path=remote_file_path):
+            logger.debug(f"Resuming {local_file_path} {con}{remote_file_path} from {current_size} bytes")
+            with open(local_file_path, "rb") as local_file, client.open(remote_file_path, "r+b") as remote_file:
+                local_file.seek(current_size)
+                remote_file.seek(current_size)
+                remote_file.set_pipelined(True)
+                copyfileobj(local_file, remote_file, Common.TRANSFER_CHUNK_SIZE)
+            if file_digests.get(local_file_path) == remote_sha256(con=con, remote_file_path=remote_file_path):
+                return
+            logger.warning(f"Resumed upload of {con}{remote_file_path} doesn't match, uploading it again")
+        logger.debug(f"Copying {con}{local_file_path} {remote_file_path}")
+        client.put(localpath=local_file_path, remotepath=remote_file_path)
+
+
+def download_output(con: Connection, command: str, local_file_path: str, extract_dir_path: str = None,
+                    tar_mode: str = None) -> None:
+    """
+    Stream command's stdout to local_file_path as it is produced. With extract_dir_path the output is a tar archive
+    (compressed according to tar_mode, see tarfile's stream modes) extracted on the fly while it is saved. The file is
+    removed if the command fails, so a truncated output doesn't pass for a complete one
+    """
+    makedirs(dirname(local_file_path), exist_ok=True)
+    channel = ssh_pool.get(con=con).open_command(command=command)
     try:
-        with SFTP(con=con) as client:
-            return client.put(local_file_path=local_file_path, remote_file_path=remote_file_path)
-    except Exception:
-        logger.error(format_exc())
+        with open(local_file_path, "wb") as local_file:
+            stdout = TeeReader(source=channel.makefile("rb", Common.TRANSFER_CHUNK_SIZE), sink=local_file)
+            if extract_dir_path is not None:
+                with tarfile.open(fileobj=stdout, mode=f"r|{tar_mode or ''}") as tar:
+                    # refuse absolute paths and links out of extract_dir_path where supported
+                    tar.extraction_filter = getattr(tarfile, "data_filter", None)
+                    for member in tar:
+                        tar.extract(member, path=extract_dir_path, set_attrs=False)
+            # the rest of the output, the archive's end padding when extracted
+            stdout.drain()
+        exit_code = channel.recv_exit_status()
+        stderr = channel.makefile_stderr("rb").read().decode(errors="replace").strip()
+        if stderr:
+            logger.debug(f"{con.hostname} stderr: {stderr}")
+        if exit_code:
+            raise RemoteCommandError(f"Command exited with {exit_code}: {stderr}")
+    except BaseException:
+        if exists(local_file_path):
+            remove(local_file_path)
+        raise
+    finally:
+        channel.close()
 
 
 def parallel_ssh_execute(command: str, coordinator: bool = False, workers: bool = False) -> List[Tuple[Future, str]]:
@@ -77,56 +345,107 @@ def parallel_ssh_execute(command: str, coordinator: bool = False, workers: bool
         connections = config.iter_workers_connections()
     else:
         connections = config.iter_connections()
-    with ThreadPoolExecutor(max_workers=config.number_of_nodes) as tpx:
-        tasks = [
-            (
-                tpx.submit(ssh_execute, con=connection, command=command),
-                connection.hostname,
-            )
-            for connection in connections
-        ]
-    return tasks
+    return fan_out(ssh_execute, connections=connections, description="Executing", log_errors=True,
+                   connect=ssh_pool.get, command=command)
 
 
-def parallel_download(
-    remote_file_path: str, local_dir_path: str
-) -> List[Tuple[Future, str]]:
+def parallel_ssh_stream(command: str, coordinator: bool = False, workers: bool = False) -> List[Tuple[Future, str]]:
+    """
+    Execute command on the nodes, echoing every output line prefixed by the node's hostname as soon as it arrives
+    (stderr lines to stderr), the futures return the exit codes, None if the command could not be executed
+    """
     config = get_config()
-    tasks = []
-    with ThreadPoolExecutor(max_workers=config.number_of_nodes) as tpx:
-        for con in config.iter_connections():
-            local_file_path = path_join(
-                local_dir_path, f"{con.role}-{con.hostname}", basename(remote_file_path)
-            )
-            makedirs(dirname(dirname(local_file_path)), exist_ok=True)
-            tasks.append(
-                (
-                    tpx.submit(
-                        download,
-                        con=con,
-                        remote_file_path=remote_file_path,
-                        local_file_path=local_file_path,
-                    ),
-                    con.hostname,
-                )
-            )
-    return tasks
+    if coordinator:
+        connections = [config.coordinator_connection]
+    elif workers:
+        connections = list(config.iter_workers_connections())
+    else:
+        connections = list(config.iter_connections())
+    width = max((len(con.hostname) for con in connections), default=0)
+    echo_lock = Lock()
+
+    def stream(con: Connection) -> int:
+        def on_line(line: str, is_stderr: bool) -> None:
+            with echo_lock:
+                echo(f"{con.hostname:<{width}}: {line}", err=is_stderr)
+        return ssh_stream(command=command, con=con, on_line=on_line)
+
+    return fan_out(stream, connections=connections, description="Executing", log_errors=True, connect=ssh_pool.get)
+
+
+def report_exit_codes(tasks: List[Tuple[Future, str]]) -> None:
+    """
+    Log the nodes a streamed command failed on, and exit with an error if there are any
+    """
+    failed = False
+    for task, hostname in tasks:
+        exit_code = task.result()
+        if exit_code == 0:
+            continue
+        failed = True
+        if exit_code is None:
+            logger.error(f"{hostname}: command could not be executed")
+        else:
+            logger.error(f"{hostname}: command exited with {exit_code}")
+    if failed:
+        raise exceptions.Exit(code=1)
 
 
 def parallel_upload(local_file_path: str, remote_file_path: str) -> List[Tuple[Future, str]]:
     config = get_config()
-    tasks = []
-    with ThreadPoolExecutor(max_workers=config.number_of_nodes) as tpx:
-        for con in config.iter_connections():
-            tasks.append(
-                (
-                    tpx.submit(
-                        upload,
-                        con=con,
-                        local_file_path=local_file_path,
-                        remote_file_path=remote_file_path,
-                    ),
-                    con.hostname,
-                )
-            )
-    return tasks
+    return fan_out(upload, connections=config.iter_connections(), description=f"Uploading {local_file_path}",
+                   log_errors=True, connect=ssh_pool.get, local_file_path=local_file_path,
+                   remote_file_path=remote_file_path)
+
+
+def relay(con: Connection, source: Connection, remote_file_path: str) -> None:
+    """
+    Copy remote_file_path from source to con, by running scp on source with the local ssh agent forwarded
+    """
+    logger.debug(f"Relaying {remote_file_path} from {source.hostname} to {con.hostname}")
+    command = (f"scp {Common.SSH_ARGS} -o BatchMode=yes -P {con.port} {remote_file_path} "
+               f"{con.username}@{con.hostname}:{remote_file_path}")
+    exit_code = ssh_stream(command=command, con=source, forward_agent=True,
+                           on_line=lambda line, _: logger.debug(f"{source.hostname} -> {con.hostname}: {line}"))
+    if exit_code:
+        raise RelayError(f"scp from {source.hostname} exited with {exit_code}")
+
+
+def relay_upload(local_file_path: str, remote_file_path: str) -> None:
+    """
+    Upload local_file_path only to the coordinator, then relay it node to node: in every round each node holding the
+    file copies it to one more node, so the holders double and the local uplink carries the file once.
+    Nodes the relay failed for get a direct upload
+    """
+    config = get_config()
+    seed, *pending = config.iter_connections()
+    try:
+        upload(con=seed, local_file_path=local_file_path, remote_file_path=remote_file_path)
+    except Exception:
+        logger.error(f"Uploading {local_file_path} to {seed.hostname} failed, uploading to all the nodes directly:\n"
+                     f"{format_exc()}")
+        parallel_upload(local_file_path=local_file_path, remote_file_path=remote_file_path)
+        return
+    holders = [seed]
+    failed = []
+    round_number = 0
+    while pending:
+        round_number += 1
+        targets, pending = pending[:len(holders)], pending[len(holders):]
+        description = f"Relaying {basename(remote_file_path)} (round {round_number}, {len(targets)} nodes)"
+        logger.info(description)
+        with FanOut(description=description, total=len(targets)) as fanout:
+            tasks = [
+                (fanout.submit(relay, con=target, source=source, remote_file_path=remote_file_path), target)
+                for source, target in zip(holders, targets)
+            ]
+        for task, target in tasks:
+            if task.exception() is None:
+                holders.append(target)
+            else:
+                logger.warning(f"Relaying {remote_file_path} to {target.hostname} failed: {task.exception()}")
+                failed.append(target)
+    if failed:
+        logger.info(f"Uploading {local_file_path} directly to {len(failed)} nodes the relay failed for")
+        fan_out(upload, connections=failed, description=f"Uploading {local_file_path}", log_errors=True,
+                connect=ssh_pool.get, local_file_path=local_file_path, remote_file_path=remote_file_path)
@@ -1,7 +1,8 @@
-from time import sleep
+from math import sqrt
 from pathlib import Path
-from typing import Tuple
-from random import choice
+from time import sleep, monotonic
+from typing import Tuple, Iterator
+from random import choice, expovariate
 from .utils import logger
 from datetime import datetime
 from ..infra.jmx import ExtVrdJmx
@@ -9,14 +10,17 @@ from json import load, dump, dumps
 from .connections import APIClient
 from click import exceptions, echo
 from collections import defaultdict
-from .connections import VaradaRest
+from .stats import latency_summary, RunStats
 from .configuration import Connection
-from .remote import parallel_rest_execute
+from .remote import AsyncDevLog
 from ..infra.rest_commands import RestCommands
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 
 overall_res = defaultdict(lambda: defaultdict(list))
+# Upper bound of queries in flight in open loop mode when concurrency (-c) is not given
+OPEN_LOOP_MAX_IN_FLIGHT = 256
+ARRIVAL_SCHEDULES = ["constant", "poisson", "ramp"]
 
 
 def get_distpatcher_stats(presto_client: APIClient,):
@@ -33,21 +37,42 @@ def get_distpatcher_stats(presto_client: APIClient,):
 
 def run_queries(serial_queries: dict, client: APIClient, multiple_query: bool, workload: int = 1, return_res: bool = False,
                 is_concurrent: bool = False, collect_query_json: bool = False, con: Connection = None,
-                query_jsons_dir: Path = None, ) -> Tuple[list, int, list]:
+                query_jsons_dir: Path = None, results_dir: Path = None, results_format: str = "jsonl",
+                dev_log: AsyncDevLog = None) -> Tuple[list, int, list]:
     q_series_results = []
     for query in serial_queries:
-        parallel_rest_execute(rest_client_type=VaradaRest, func=RestCommands.dev_log, msg=f"VTM Run Query: {query}")
-        q_res, q_stats = client.execute(query=serial_queries[query])
+        if dev_log is not None:
+            dev_log.log(msg=f"VTM Run Query: {query}")
+        results_file = None
+        if return_res and results_dir:
+            # Stream the full result set to disk, keeping only a preview in memory
+            results_file = f"{results_dir}/query_{query}_results_{datetime.now().strftime('%H%M%S%f')}.{results_format}"
+            with open(results_file, 'w', newline='') as fd:
+                q_res, q_stats = client.execute_streaming(query=serial_queries[query], fd=fd,
+                                                          results_format=results_format)
+        else:
+            q_res, q_stats = client.execute(query=serial_queries[query])
         q_series_results.append({"queryName": query, "queryId": q_stats["queryId"],
                                  "elapsedTime": round(q_stats["elapsedTimeMillis"] * 0.001, 3),
                                  "cpuTime": round(q_stats["cpuTimeMillis"] * 0.001, 3),
+                                 "queuedTime": round(q_stats.get("queuedTimeMillis", 0) * 0.001, 3),
                                  "processedRows": q_stats["processedRows"],
                                  "processedBytes": q_stats["processedBytes"],
                                  "totalSplits": q_stats["totalSplits"],
                                  "results": q_res[0:9] if (return_res and multiple_query) else None,
+                                 "resultRows": q_stats["client"]["rows"],
+                                 "timeToFirstRow": round(q_stats["client"]["timeToFirstRowMillis"] * 0.001, 3),
+                                 "timeToLastRow": round(q_stats["client"]["timeToLastRowMillis"] * 0.001, 3),
+                                 "clientOverhead": round(q_stats["client"]["overheadMillis"] * 0.001, 3),
+                                 "httpRequests": q_stats["client"]["httpRequests"],
+                                 "bytesReceived": q_stats["client"]["bytesReceived"],
                                  })
+        if results_file:
+            q_series_results[-1]["resultsFile"] = results_file
         logger.info(f'Query: {query} QueryId: {q_stats["queryId"]} '
-                    f'Single query execution time: {round(q_stats["elapsedTimeMillis"] * 0.001, 3)} Seconds')
+                    f'Single query execution time: {round(q_stats["elapsedTimeMillis"] * 0.001, 3)} Seconds, '
+                    f'client overhead: {q_series_results[-1]["clientOverhead"]} Seconds, '
+                    f'{q_stats["client"]["httpRequests"]} HTTP requests, {q_stats["client"]["bytesReceived"]} bytes')
         if collect_query_json:
             logger.info(f'Getting query json for query_id {q_stats["queryId"]}, saving to {query_jsons_dir}')
             RestCommands.save_query_json(con=con, dest_dir=query_jsons_dir, query_id=q_stats["queryId"])
@@ -137,9 +162,195 @@ def run_txt(file_path: Path, concurrency: int, random: bool, queries_list: list,
     return queries_to_run, concurrency_factor
 
 
+def save_summary(run_stats: RunStats, wall_seconds: float, destination_dir: Path) -> None:
+    summary = run_stats.summary(wall_seconds=wall_seconds)
+    logger.info(RunStats.format(name="Overall", summary=summary["overall"]))
+    for workload, workload_summary in summary["workloads"].items():
+        logger.info(RunStats.format(name=f"Workload {workload[len('workload'):]}", summary=workload_summary))
+    for query_name, query_summary in summary["queries"].items():
+        logger.info(RunStats.format(name=f"Query {query_name}", summary=query_summary))
+    with open(f"{destination_dir}/query_runner_summary_{datetime.now().strftime('%H%M%S%f')}.json", 'w') as fd:
+        dump(summary, fd, indent=2)
+        echo(f'saving run summary to: {fd.name}')
+
+
+def load_queries_pool(jsonpath: Path, txtpath: Path, queries_list: list, get_results: bool) -> dict:
+    """
+    Load the queries to draw from in sustained mode, limited to the names/indices in queries_list if given
+    """
+    file_path = jsonpath if jsonpath else txtpath
+    try:
+        with open(file_path) as fd:
+            if jsonpath:
+                queries = load(fd)
+            else:
+                queries = {query_number: query for query_number, query in enumerate(fd.read().split(";"))
+                           if query.strip()}
+    except Exception as e:
+        logger.exception(f"Failed to open {file_path}: {e}")
+        raise exceptions.Exit(code=1)
+    if queries_list:
+        names = [query_name if jsonpath else int(query_name) for series in queries_list for query_name in series]
+        validate_queries_list([names], queries)
+        queries = {name: queries[name] for name in names}
+    return {name: f'--{name if jsonpath else f"Query{name}"}\n {query}' if get_results else
+                  f'--{name if jsonpath else f"Query{name}"}\n EXPLAIN ANALYZE {query}'
+            for name, query in queries.items()}
+
+
+def report_window(queries: list, failed: int, window_seconds: float, elapsed_seconds: float,
+                  launched: int = None) -> dict:
+    window = {"elapsedSeconds": round(elapsed_seconds, 3),
+              "queries": len(queries),
+              "failed": failed,
+              "queriesPerMinute": round(len(queries) * 60 / window_seconds, 3) if window_seconds else 0,
+              "elapsedTime": latency_summary([query_data["elapsedTime"] for query_data in queries]),
+              "queuedTime": latency_summary([query_data["queuedTime"] for query_data in queries])}
+    launched_msg = ""
+    if launched is not None:
+        window["launchedPerMinute"] = round(launched * 60 / window_seconds, 3) if window_seconds else 0
+        launched_msg = f' ({window["launchedPerMinute"]} launched)'
+    logger.info(f'{window["elapsedSeconds"]} Seconds: {window["queries"]} queries completed, {failed} failed, '
+                f'{window["queriesPerMinute"]} queries per minute{launched_msg}, '
+                f'elapsed time p50 {window["elapsedTime"]["p50"]} p90 {window["elapsedTime"]["p90"]} '
+                f'p99 {window["elapsedTime"]["p99"]} max {window["elapsedTime"]["max"]} Seconds, '
+                f'queued time p99 {window["queuedTime"]["p99"]} Seconds')
+    return window
+
+
+def run_sustained(client: APIClient, executor: ThreadPoolExecutor, dev_log: AsyncDevLog, queries_pool: dict,
+                  concurrency: int, duration: int, report_interval: int, collect_query_json: bool = False,
+                  con: Connection = None, query_jsons_dir: Path = None, results_dir: Path = None,
+                  results_format: str = "jsonl") -> Tuple[list, list]:
+    """
+    Closed loop: keep exactly `concurrency` queries in flight for `duration` seconds, a random query from the pool
+    is launched as soon as a running one finishes. Full results are streamed to files in results_dir if given
+    """
+    in_flight = {}
+    completed, timeline, window, failed = [], [], [], 0
+
+    def launch():
+        query_name = choice(list(queries_pool.keys()))
+        in_flight[executor.submit(run_queries, {query_name: queries_pool[query_name]}, client, True, 1,
+                                  results_dir is not None, True, collect_query_json, con, query_jsons_dir, results_dir,
+                                  results_format, dev_log=dev_log)] = query_name
+
+    start = window_start = monotonic()
+    for _ in range(concurrency):
+        launch()
+    while in_flight:
+        done, _ = wait(in_flight, timeout=max(window_start + report_interval - monotonic(), 0),
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            query_name = in_flight.pop(future)
+            try:
+                query_stats, _, _ = future.result()
+                window.extend(query_stats)
+            except Exception as e:
+                logger.error(f'Query {query_name} failed: {e}')
+                failed += 1
+            if monotonic() - start < duration:
+                launch()
+        now = monotonic()
+        if now - window_start >= report_interval or not in_flight:
+            timeline.append(report_window(queries=window, failed=failed, window_seconds=now - window_start,
+                                          elapsed_seconds=now - start))
+            completed.extend(window)
+            window, failed, window_start = [], 0, now
+    return completed, timeline
+
+
+def arrival_times(rate: float, duration: int, arrival: str, ramp_from: float = 0) -> Iterator[float]:
+    """
+    Offsets in seconds from the start of the run at which queries are launched, `rate` is in queries per second.
+    ramp grows (or shrinks) the rate linearly from `ramp_from` to `rate` over the duration
+    """
+    if rate <= 0 or ramp_from < 0:
+        raise ValueError(f"Arrival rate must be positive and ramp start rate non negative, got {rate} and {ramp_from}")
+    offset, launched = 0, 0
+    while True:
+        if arrival == "poisson":
+            offset += expovariate(rate)
+        elif arrival == "ramp" and rate != ramp_from:
+            # solve ramp_from * t + (rate - ramp_from) * t^2 / (2 * duration) = launched for t
+            launched += 1
+            slope = (rate - ramp_from) / duration
+            discriminant = ramp_from ** 2 + 2 * slope * launched
+            if discriminant < 0:
+                return
+            offset = (sqrt(discriminant) - ramp_from) / slope
+        else:
+            offset += 1 / rate
+        if offset > duration:
+            return
+        yield offset
+
+
+def run_scheduled(scheduled: float, *args, **kw) -> Tuple[list, int, list]:
+    # time between the planned launch and the actual start, grows when all the executor threads are busy
+    dispatch_delay = round(max(monotonic() - scheduled, 0), 3)
+    query_stats, workload, query_results = run_queries(*args, **kw)
+    for query_data in query_stats:
+        query_data["dispatchDelay"] = dispatch_delay
+    return query_stats, workload, query_results
+
+
+def run_open_loop(client: APIClient, executor: ThreadPoolExecutor, dev_log: AsyncDevLog, queries_pool: dict,
+                  rate: float, duration: int, arrival: str, ramp_from: float, report_interval: int,
+                  collect_query_json: bool = False, con: Connection = None,
+                  query_jsons_dir: Path = None, results_dir: Path = None,
+                  results_format: str = "jsonl") -> Tuple[list, list]:
+    """
+    Open loop: launch random queries from the pool at the given arrival rate regardless of completions. Full results
+    are streamed to files in results_dir if given
+    """
+    in_flight = {}
+    completed, timeline, window, failed, launched = [], [], [], 0, 0
+    schedule = arrival_times(rate=rate, duration=duration, arrival=arrival, ramp_from=ramp_from)
+    start = window_start = monotonic()
+    next_arrival = next(schedule, None)
+    while next_arrival is not None or in_flight:
+        while next_arrival is not None and start + next_arrival <= monotonic():
+            query_name = choice(list(queries_pool.keys()))
+            in_flight[executor.submit(run_scheduled, start + next_arrival, {query_name: queries_pool[query_name]},
+                                      client, True, 1, results_dir is not None, True, collect_query_json, con,
+                                      query_jsons_dir, results_dir, results_format, dev_log=dev_log)] = query_name
+            launched += 1
+            next_arrival = next(schedule, None)
+        timeout = window_start + report_interval - monotonic()
+        if next_arrival is not None:
+            timeout = min(timeout, start + next_arrival - monotonic())
+        timeout = max(timeout, 0)
+        if in_flight:
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        else:
+            sleep(timeout)
+            done = set()
+        for future in done:
+            query_name = in_flight.pop(future)
+            try:
+                query_stats, _, _ = future.result()
+                window.extend(query_stats)
+            except Exception as e:
+                logger.error(f'Query {query_name} failed: {e}')
+                failed += 1
+        now = monotonic()
+        if now - window_start >= report_interval or (next_arrival is None and not in_flight):
+            window_res = report_window(queries=window, failed=failed, window_seconds=now - window_start,
+                                       elapsed_seconds=now - start, launched=launched)
+            window_res["inFlight"] = len(in_flight)
+            window_res["dispatchDelay"] = latency_summary([query_data["dispatchDelay"] for query_data in window])
+            timeline.append(window_res)
+            completed.extend(window)
+            window, failed, launched, window_start = [], 0, 0, now
+    return completed, timeline
+
+
 def run(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrency: int, random: bool, iterations: int,
         sleep_time: int, con: Connection, catalog: str, destination_dir: Path, get_results: bool = False,
-        session_properties: dict = None, collect_query_json: bool = False, collect_dispatcher_stats: bool = False):
+        session_properties: dict = None, collect_query_json: bool = False, collect_dispatcher_stats: bool = False,
+        results_format: str = "jsonl", duration: int = None, report_interval: int = 60, rate: float = None, arrival: str = "constant",
+        ramp_from: float = 0):
     func_maps = {
         (False, True): (run_txt, txtpath),
         (True, False): (run_json, jsonpath)
@@ -147,18 +358,34 @@ def run(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrenc
     if not (txtpath or jsonpath):
         logger.exception(f"Please specify either json file (-j) or txt file (-f) with queries")
         raise exceptions.Exit(code=1)
+    if rate and not duration:
+        logger.exception("Duration option (-du) must be specified with rate option (-qps)")
+        raise exceptions.Exit(code=1)
+    if duration and not (concurrency or rate):
+        logger.exception("Concurrency (-c) or rate (-qps) option must be specified with duration option (-du)")
+        raise exceptions.Exit(code=1)
     if random:
         if queries_list:
-            logger.exception(f"Random option (-r) cannot be run with queries_list argument")
+            logger.exception("Random option (-r) cannot be run with queries_list argument")
             raise exceptions.Exit(code=1)
         elif not concurrency:
-            logger.exception(f"Concurrency option (-c) must be specified with random option (-r)")
+            logger.exception("Concurrency option (-c) must be specified with random option (-r)")
             raise exceptions.Exit(code=1)
     if collect_query_json:
         # Create separate local directory for jsons
         query_jsons_dir = Path(f'{destination_dir}_query_jsons_{datetime.now()}'.replace(' ', '_').replace(':', '-'))
         query_jsons_dir.mkdir()
 
+    if duration:
+        run_load_mode(user=user, jsonpath=jsonpath, txtpath=txtpath, queries_list=queries_list,
+                      concurrency=concurrency, con=con, catalog=catalog, destination_dir=destination_dir,
+                      get_results=get_results, session_properties=session_properties,
+                      collect_query_json=collect_query_json, collect_dispatcher_stats=collect_dispatcher_stats,
+                      duration=duration, report_interval=report_interval, rate=rate, arrival=arrival,
+                      ramp_from=ramp_from, query_jsons_dir=query_jsons_dir if collect_query_json else None,
+                      results_format=results_format)
+        return
+
     func, file_path = func_maps[(bool(jsonpath), bool(txtpath))]
     queries_prepared, verified_concurrency = func(file_path=file_path,
                                                   concurrency=concurrency,
@@ -176,32 +403,40 @@ def run(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrenc
     if session_properties:
         logger.info(f'Running with session properties: {session_properties}')
 
-    with APIClient(con=con, username=user, session_properties=session_properties, catalog=catalog) as client:
-        parallel_rest_execute(rest_client_type=VaradaRest, func=RestCommands.dev_log, msg="VTM Query Runner Start")
+    # Queries are I/O bound HTTP polls against the coordinator, a single thread pool is kept alive for all the
+    # iterations, each worker thread holds its own connection to the coordinator through the shared client
+    # Dev log markers are shipped to the nodes in the background, so they don't delay the queries launch
+    with APIClient(con=con, username=user, session_properties=session_properties, catalog=catalog) as client, \
+            ThreadPoolExecutor(max_workers=verified_concurrency) as executor, AsyncDevLog() as dev_log:
+        dev_log.log(msg="VTM Query Runner Start")
+        run_stats = RunStats()
+        # wall clock time spent running queries, the sleeps between iterations are left out of the throughput
+        run_seconds = 0
         for iteration in range(iterations):
             logger.info(f"Running: Iteration {iteration + 1}")
-            parallel_rest_execute(rest_client_type=VaradaRest,
-                                  func=RestCommands.dev_log,
-                                  msg=f"VTM Query Runner Iteration {iteration + 1}")
+            dev_log.log(msg=f"VTM Query Runner Iteration {iteration + 1}")
             if collect_dispatcher_stats:
                 logger.info("Dispatcher stats before query run:")
                 get_distpatcher_stats(presto_client=client)
 
+            iteration_start = monotonic()
             futures = []
-            with ProcessPoolExecutor(max_workers=verified_concurrency) as executor:
-                for series in queries_prepared:
-                    for query in series:
-                        futures.append(executor.submit(run_queries,
-                                                       query,
-                                                       client,
-                                                       multiple_query,
-                                                       queries_prepared.index(series) + 1,
-                                                       get_results,
-                                                       verified_concurrency > 1,
-                                                       collect_query_json,
-                                                       con,
-                                                       query_jsons_dir if collect_query_json else None,
-                                                       ))
+            for series in queries_prepared:
+                for query in series:
+                    futures.append(executor.submit(run_queries,
+                                                   query,
+                                                   client,
+                                                   multiple_query,
+                                                   queries_prepared.index(series) + 1,
+                                                   get_results,
+                                                   verified_concurrency > 1,
+                                                   collect_query_json,
+                                                   con,
+                                                   query_jsons_dir if collect_query_json else None,
+                                                   destination_dir,
+                                                   results_format,
+                                                   dev_log=dev_log,
+                                                   ))
             queries_done = 0
             total_elapsed_time = 0
             for future in as_completed(futures):
@@ -209,16 +444,17 @@ def run(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrenc
                 for query_data in query_stats:
                     queries_done += 1
                     overall_res[f'iteration{iteration + 1}'][f'workload{workload}'].append(query_data)
+                    run_stats.add(query_data=query_data, workload=workload)
                     total_elapsed_time += query_data["elapsedTime"]
                     logger.info(
                         f'Query {query_data["queryName"]} elapsed time is {query_data["elapsedTime"]} Seconds, cpu time is {query_data["cpuTime"]} Seconds')
                     if query_results:
                         echo(f'Query {query_data["queryName"]} results:\n {query_results[0:9]}')
-                        if get_results and len(query_results) > 10:
-                            with open(f"{destination_dir}/query_{query_data['queryName']}_results_{datetime.now().strftime('%H%M%S%f')}.json", 'w') as fd:
-                                echo(f'Query {query_data["queryName"]} full results saved to file {fd.name}')
-                                dump(query_results, fd, indent=2)
-                            fd.close()
+                    if query_data.get("resultsFile"):
+                        echo(f'Query {query_data["queryName"]} full results ({query_data["resultRows"]} rows) saved '
+                             f'to file {query_data["resultsFile"]}, time to first row {query_data["timeToFirstRow"]} '
+                             f'Seconds, time to last row {query_data["timeToLastRow"]} Seconds')
+            run_seconds += monotonic() - iteration_start
 
             if collect_dispatcher_stats:
                 logger.info("Dispatcher stats after query run:")
@@ -229,9 +465,82 @@ def run(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrenc
             if sleep_time and iteration < iterations:
                 logger.info(f'Sleeping {sleep_time} seconds before next run')
                 sleep(sleep_time)
-        parallel_rest_execute(rest_client_type=VaradaRest, func=RestCommands.dev_log, msg="VTM Query Runner End")
+        dev_log.log(msg="VTM Query Runner End")
         logger.info(f'Overall run results: {dumps(overall_res, indent=2)}')
         with open(f"{destination_dir}/query_runner_overall_results_{datetime.now().strftime('%H%M%S%f')}.json", 'w') as fd:
             dump(overall_res, fd, indent=2)
             echo(f'saving overall run results to: {fd.name}')
         fd.close()
+        save_summary(run_stats=run_stats, wall_seconds=run_seconds, destination_dir=destination_dir)
+
+
+def run_load_mode(user: str, jsonpath: Path, txtpath: Path, queries_list: list, concurrency: int,
+                  con: Connection, catalog: str, destination_dir: Path, get_results: bool,
+                  session_properties: dict, collect_query_json: bool, collect_dispatcher_stats: bool,
+                  duration: int, report_interval: int, rate: float = None, arrival: str = "constant",
+                  ramp_from: float = 0, query_jsons_dir: Path = None, results_format: str = "jsonl"):
+    """
+    Duration based runs, closed loop with sustained concurrency or open loop with a target arrival rate if given
+    """
+    if collect_dispatcher_stats:
+        logger.exception("Collecting jmx_stats not supported for multiple queries")
+        raise exceptions.Exit(code=1)
+    queries_pool = load_queries_pool(jsonpath=jsonpath, txtpath=txtpath, queries_list=queries_list,
+                                     get_results=get_results)
+    max_workers = concurrency if concurrency else OPEN_LOOP_MAX_IN_FLIGHT
+    if rate:
+        logger.info(f'Run the queries on catalog {catalog}, for {duration} Seconds with {arrival} arrival rate '
+                    f'{f"{ramp_from} to " if arrival == "ramp" else ""}{rate} queries per second, '
+                    f'up to {max_workers} in flight, drawing from {list(queries_pool.keys())}')
+    else:
+        logger.info(f'Run the queries on catalog {catalog}, for {duration} Seconds with sustained concurrency '
+                    f'{concurrency}, drawing from {list(queries_pool.keys())}')
+    if session_properties:
+        logger.info(f'Running with session properties: {session_properties}')
+
+    with APIClient(con=con, username=user, session_properties=session_properties, catalog=catalog) as client, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor, AsyncDevLog() as dev_log:
+        dev_log.log(msg="VTM Query Runner Start")
+        if rate:
+            completed, timeline = run_open_loop(client=client, executor=executor, dev_log=dev_log,
+                                                queries_pool=queries_pool,
+                                                rate=rate, duration=duration, arrival=arrival, ramp_from=ramp_from,
+                                                report_interval=report_interval,
+                                                collect_query_json=collect_query_json, con=con,
+                                                query_jsons_dir=query_jsons_dir,
+                                                results_dir=destination_dir if get_results else None,
+                                                results_format=results_format)
+        else:
+            completed, timeline = run_sustained(client=client, executor=executor, dev_log=dev_log,
+                                                queries_pool=queries_pool,
+                                                concurrency=concurrency, duration=duration,
+                                                report_interval=report_interval,
+                                                collect_query_json=collect_query_json, con=con,
+                                                query_jsons_dir=query_jsons_dir,
+                                                results_dir=destination_dir if get_results else None,
+                                                results_format=results_format)
+        dev_log.log(msg="VTM Query Runner End")
+
+    total_seconds = timeline[-1]["elapsedSeconds"] if timeline else 0
+    load_res = {"mode": "open" if rate else "closed",
+                "concurrency": concurrency,
+                "rate": rate,
+                "arrival": arrival if rate else None,
+                "duration": duration,
+                "overall": {"queries": len(completed),
+                            "failed": sum(window["failed"] for window in timeline),
+                            "queriesPerMinute": round(len(completed) * 60 / total_seconds, 3)
+                            if total_seconds else 0,
+                            "elapsedTime": latency_summary([query_data["elapsedTime"] for query_data in completed]),
+                            "queuedTime": latency_summary([query_data["queuedTime"] for query_data in completed])},
+                "timeline": timeline,
+                "queries": completed}
+    logger.info(f'Overall run results: {dumps(load_res["overall"], indent=2)}')
+    run_stats = RunStats()
+    for query_data in completed:
+        run_stats.add(query_data=query_data)
+    file_name = f"query_runner_{'open_loop' if rate else 'sustained'}_results_{datetime.now().strftime('%H%M%S%f')}.json"
+    with open(f"{destination_dir}/{file_name}", 'w') as fd:
+        dump(load_res, fd, indent=2)
+        echo(f'saving {"open loop" if rate else "sustained"} run results to: {fd.name}')
+    save_summary(run_stats=run_stats, wall_seconds=total_seconds, destination_dir=destination_dir)
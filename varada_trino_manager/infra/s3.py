@@ -22,11 +22,12 @@ class Client(metaclass=SingletonMeta):
 
 
 class S3URL:
-    def __init__(self, url, etag=None):
+    def __init__(self, url, etag=None, size=None):
         self.url = urlpath.URL(url)
         if (self.url.scheme != "s3") and (self.url.scheme != "s3a"):
             raise ValueError(f'Bad S3 URL: "{url}"')
         self._etag = etag
+        self.size = size
         self.client = Client().client
 
     @property
@@ -51,6 +52,12 @@ class S3URL:
             stream = gzip.GzipFile(fileobj=stream)
         return stream
 
+    def download_file(self, file_path):
+        """
+        Save the object's raw (still compressed) content to file_path, streamed to disk
+        """
+        self.client.download_file(self.bucket, self.path, str(file_path))
+
     def download_text(self):
         buffer = self.download()
         try:
@@ -73,7 +80,7 @@ class S3URL:
                 if obj["StorageClass"] == "STANDARD" and fnmatch.fnmatch(obj["Key"], self.path):
                     path = obj["Key"]
                     url = f's3://{bucket}/{path}'
-                    yield S3URL(url=url, etag=obj["ETag"])
+                    yield S3URL(url=url, etag=obj["ETag"], size=obj["Size"])
 
     def glob_folders(self):
         prefix = self.path.split("*")[0]
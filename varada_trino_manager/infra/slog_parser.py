@@ -0,0 +1,225 @@
+import gzip
+from json import loads
+from re import compile, search
+from time import mktime
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from .metrics_store import MetricsSeries
+
+# Kept free of plotting imports: the call-home parsing processes are spawned and import this module, not
+# call_home_methods
+
+MARKER = "METRICS-DUMP"
+# the full grammar of a metrics line, only used for lines not in the usual "<timestamp> INFO ... METRICS-DUMP" shape
+LINE_PATTERN = compile(r"(\S+)\s+INFO.*METRICS-DUMP\s+(.*)")
+GROUP_PATTERN = compile(r"[^.]+")
+# "+10 (2197)" -> delta 10, absolute 2197
+VALUE_PATTERN = compile(r"([+\-]\d+).*\((\d+)\)")
+SIGNS = ("+", "-")
+
+
+def parse_value(value: str, absolute: bool) -> Optional[int]:
+    """
+    The delta or the absolute value of a "+10 (2197)" metric value, None if it isn't one
+    """
+    if not isinstance(value, str):
+        return None
+    delta, _, total = value.partition(" (")
+    if delta[:1] in SIGNS and delta[1:].isdecimal() and total[-1:] == ")" and total[:-1].isdecimal():
+        return int(total[:-1] if absolute else delta)
+    match = VALUE_PATTERN.search(value)
+    if match is None:
+        return None
+    return int(match.group(2 if absolute else 1))
+
+
+def line_timestamp_ms(timestamp: str) -> Optional[float]:
+    """
+    Epoch milliseconds of a 2022-02-08T06:39:23.787Z slog timestamp, read as local time like the time range
+    """
+    try:
+        parsed = datetime.strptime(timestamp.split("Z")[0], "%Y-%m-%dT%H:%M:%S.%f")
+    except ValueError:
+        return None
+    return mktime(parsed.timetuple()) * 1000 + parsed.microsecond // 1000
+
+
+class MetricsDumpParser:
+    """
+    Single pass parser of the slog METRICS-DUMP lines: other lines are dropped by a substring check, the usual line
+    shape is split without regular expressions, and the key name and delta/absolute choice of every group-metric
+    pair are computed once
+    """
+
+    def __init__(self, delta_metrics):
+        self.__delta_metrics = delta_metrics
+        # group -> metric -> (key name, whether the absolute value is used)
+        self.__keys: Dict[str, Dict[str, Tuple[str, bool]]] = {}
+
+    def split(self, line: str) -> Optional[Tuple[str, str]]:
+        """
+        (line timestamp, json payload) of a METRICS-DUMP line
+        """
+        marker = line.find(MARKER)
+        if marker < 0:
+            return None
+        head = line[:marker].split(None, 2)
+        payload = line[marker + len(MARKER):]
+        if len(head) >= 2 and head[1].startswith("INFO") and payload[:1].isspace() \
+                and line.find(MARKER, marker + 1) < 0:
+            return head[0], payload.lstrip()
+        match = LINE_PATTERN.search(line)
+        return match.groups() if match else None
+
+    def __group_keys(self, group: str) -> Dict[str, Tuple[str, bool]]:
+        keys = self.__keys.get(group)
+        if keys is None:
+            keys = self.__keys[group] = {}
+        return keys
+
+    def __key(self, group: str, metric: str) -> Tuple[str, bool]:
+        names = GROUP_PATTERN.findall(group)
+        # the catalog suffix is dropped from "dispatcherPageSource.varada"
+        key = (f"{names[0] if names else None}-{metric}", metric in self.__delta_metrics)
+        self.__group_keys(group)[metric] = key
+        return key
+
+    def parse(self, line: str) -> Optional[Tuple[str, float, Dict[str, int]]]:
+        """
+        (catalog, timestamp in seconds, value per group-metric key) of a METRICS-DUMP line, None for other lines
+        """
+        if MARKER not in line:
+            return None
+        split = self.split(line)
+        if split is None or 'stats":' not in split[1]:
+            return None
+        line_time, payload = split
+        json_data = loads(payload)
+        timestamp = json_data["timestamp"] if "timestamp" in json_data else line_timestamp_ms(line_time)
+        if not timestamp:
+            return None
+
+        values = {}
+        for group, metrics in json_data["stats"].items():
+            if not metrics:
+                continue
+            keys = self.__group_keys(group)
+            for metric, value in metrics.items():
+                keyname, absolute = keys.get(metric) or self.__key(group, metric)
+                # parse_value inlined for the usual "+10 (2197)" shape
+                delta, _, total = value.partition(" (") if type(value) is str else ("", "", "")
+                if delta[:1] in SIGNS and total[-1:] == ")" and delta[1:].isdecimal() and total[:-1].isdecimal():
+                    val = int(total[:-1] if absolute else delta)
+                else:
+                    val = parse_value(value, absolute)
+                    if val is None:
+                        continue
+                values[keyname] = values.get(keyname, 0) + val
+        return json_data.get("catalog", "varada"), timestamp / 1000, values
+
+
+'''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
+                         Parse metrics
+
+example of metrics line in slog:
+2022-02-08T07:16:35.437Z	INFO	Timer-1	METRICS-DUMP	{"stats":{"dictionary.varada":{"dictionaries_size":"-55 (0)",
+                                                            "dictionary_read_elements_count":"+10 (21)","dictionary_entries":"-1 (0)",
+                                                            "dictionaries_varlen_str_size":"-55 (0)",
+                                                            "dictionary_loaded_elements_count":"+1 (14)"},
+                                                            "dispatcherPageSource.varada":{"varada_collect_columns":"+10 (2197)",
+                                                            "cached_total_rows":"+10 (127390974)","cached_files":"+10 (5957)",
+                                                            "prefilled_collect_columns":"+10 (3496)",
+                                                            "prefilled_collect_bytes":"+5 (34843226)",
+                                                            "varada_match_columns":"+10 (3853)","cached_varada_success_files":"+10 (5779)",
+                                                            "cached_read_rows":"+1 (37351331)"},"warmup-exporter.varada":{"export_disabled":"+10 (27289)"},
+                                                            "worker-task-executor.varada":{"task_scheduled":"+10 (36068)","task_finished":"+10 (36068)"}},
+                                                            "catalog":"varada","worker-nodes":1,"timestamp":1644304595437}
+
+'''
+
+
+class SlogMetrics:
+    """
+    METRICS-DUMP values summed into time buckets of frequency_minutes per catalog, fed one line at a time so slogs are
+    never held in memory
+    """
+
+    def __init__(self, frequency_minutes: float, start_time: float, end_time: float, delta_metrics):
+        self.frequency_minutes = frequency_minutes
+        self.start_time = start_time
+        self.end_time = end_time
+        self.delta_metrics = delta_metrics
+        self.catalogs: Dict[str, MetricsSeries] = {}
+        self.__parser = MetricsDumpParser(delta_metrics)
+
+    def add(self, catalog: str, timestamp: float, values: Dict[str, int]) -> None:
+        if timestamp < self.start_time or timestamp > self.end_time:
+            return
+        series = self.catalogs.get(catalog)
+        if series is None:
+            series = self.catalogs[catalog] = MetricsSeries()
+        series.add(int(timestamp / (60 * self.frequency_minutes)), timestamp, values)
+
+    def add_line(self, line: str) -> None:
+        parsed = self.__parser.parse(line)
+        if parsed:
+            self.add(*parsed)
+
+    def compact(self) -> Dict[str, MetricsSeries]:
+        for series in self.catalogs.values():
+            series.compact()
+        return self.catalogs
+
+    def merge(self, catalogs: Dict[str, MetricsSeries]) -> None:
+        """
+        Add the series aggregated elsewhere with the same frequency, in their order
+        """
+        for catalog, series in catalogs.items():
+            self.catalogs.setdefault(catalog, MetricsSeries()).merge(series)
+
+    def resample(self, granularity_minutes: float) -> Dict[str, MetricsSeries]:
+        """
+        The series per catalog in buckets of granularity_minutes, a multiple of frequency_minutes
+        """
+        factor = granularity_minutes / self.frequency_minutes
+        if not factor.is_integer():
+            raise ValueError(f"Granularity of {granularity_minutes} minutes isn't a multiple of "
+                             f"{self.frequency_minutes} minutes")
+        return {catalog: series.resample(int(factor)) for catalog, series in self.catalogs.items()}
+
+
+def resolution_minutes(granularity_minutes: float) -> float:
+    """
+    The buckets slogs are parsed into, one minute ones can be resampled to any whole minutes granularity
+    """
+    return 1 if float(granularity_minutes).is_integer() else granularity_minutes
+
+
+def grep_line(line: str, grep_str: str, start_time, end_time) -> bool:
+    if search(grep_str, line):
+        logtime = mktime(datetime.strptime(line.split('Z')[0], "%Y-%m-%dT%H:%M:%S.%f").timetuple())  # 2022-02-08T06:39:23.787Z
+        return start_time <= logtime <= end_time
+    return False
+
+
+def iter_file_lines(file_path: str, gzipped: bool) -> Iterator[str]:
+    with (gzip.open(file_path, "rb") if gzipped else open(file_path, "rb")) as stream:
+        for line in stream:
+            yield line.rstrip(b"\n").decode(errors="replace")
+
+
+def parse_slog(slog_path: str, gzipped: bool, frequency_minutes: int, start_time, end_time, delta_metrics,
+               audit: bool, error: bool) -> Tuple[dict, List[str], List[str]]:
+    """
+    Runs in the parsing processes: the metrics buckets, AUDIT lines and ERROR lines of one slog spooled to disk,
+    read line by line
+    """
+    metrics = SlogMetrics(frequency_minutes, start_time, end_time, delta_metrics)
+    audit_lines, error_lines = [], []
+    for line in iter_file_lines(slog_path, gzipped):
+        if audit and grep_line(line, "AUDIT", start_time, end_time):
+            audit_lines.append(line)
+        if error and grep_line(line, "ERROR", start_time, end_time):
+            error_lines.append(line)
+        metrics.add_line(line)
+    return metrics.compact(), audit_lines, error_lines
@@ -0,0 +1,185 @@
+from math import ceil
+from typing import List
+from collections import defaultdict
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of values, 0 for an empty list
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def latency_summary(values: List[float]) -> dict:
+    summary = {"count": len(values)}
+    summary.update({f"p{pct}": percentile(values, pct) for pct in PERCENTILES})
+    summary["max"] = max(values) if values else 0
+    return summary
+
+
+class Histogram:
+    """
+    HDR style histogram of non negative integer values (milliseconds), every power of two range is split into
+    2 ** (SUB_BUCKET_BITS - 1) linear buckets, so a reported percentile is within 1% of the recorded value while
+    memory only depends on the value range, not on the number of values recorded
+    """
+    SUB_BUCKET_BITS = 8
+
+    def __init__(self):
+        self.__counts = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __bucket(self, value: int) -> int:
+        shift = max(value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        # the highest value falling in the same bucket
+        return ((value >> shift) << shift) + (1 << shift) - 1
+
+    def record(self, value: float) -> None:
+        value = max(int(round(value)), 0)
+        self.__counts[self.__bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, pct: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(ceil(pct / 100 * self.count), 1)
+        seen = 0
+        for bucket in sorted(self.__counts):
+            seen += self.__counts[bucket]
+            if seen >= rank:
+                return min(bucket, self.max)
+        return self.max
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        """
+        Add the values recorded in other, as if they were recorded in this histogram
+        """
+        for bucket, count in other.__counts.items():
+            self.__counts[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def compact(self) -> List[list]:
+        """
+        Counts per power of two range as [upper bound, count] pairs, empty ranges are omitted
+        """
+        counts = defaultdict(int)
+        for bucket, count in self.__counts.items():
+            counts[(1 << bucket.bit_length()) - 1] += count
+        return [[upper_bound, counts[upper_bound]] for upper_bound in sorted(counts)]
+
+    def summary(self, scale: float = 1) -> dict:
+        summary = {"count": self.count, "mean": round(self.mean * scale, 3)}
+        summary.update({f"p{pct}": round(self.percentile(pct) * scale, 3) for pct in PERCENTILES})
+        summary["max"] = round((self.max or 0) * scale, 3)
+        summary["histogram"] = [[round(upper_bound * scale, 3), count] for upper_bound, count in self.compact()]
+        return summary
+
+
+class QueriesStats:
+    """
+    Incrementally aggregated stats of query runner results (as returned by run_queries), times are in seconds.
+    Throughput is over the wall clock time of the run, per query elapsed times overlap when queries run concurrently
+    """
+
+    def __init__(self):
+        self.elapsed = Histogram()
+        self.cpu = Histogram()
+        self.queued = Histogram()
+        self.time_to_first_row = Histogram()
+        self.client_overhead = Histogram()
+        self.processed_rows = 0
+        self.processed_bytes = 0
+        self.http_requests = 0
+        self.bytes_received = 0
+
+    def add(self, query_data: dict) -> None:
+        self.elapsed.record(query_data["elapsedTime"] * 1000)
+        self.cpu.record(query_data["cpuTime"] * 1000)
+        self.queued.record(query_data.get("queuedTime", 0) * 1000)
+        self.time_to_first_row.record(query_data.get("timeToFirstRow", 0) * 1000)
+        self.client_overhead.record(query_data.get("clientOverhead", 0) * 1000)
+        self.processed_rows += query_data["processedRows"]
+        self.processed_bytes += query_data["processedBytes"]
+        self.http_requests += query_data.get("httpRequests", 0)
+        self.bytes_received += query_data.get("bytesReceived", 0)
+
+    def merge(self, other: "QueriesStats") -> "QueriesStats":
+        self.elapsed.merge(other.elapsed)
+        self.cpu.merge(other.cpu)
+        self.queued.merge(other.queued)
+        self.time_to_first_row.merge(other.time_to_first_row)
+        self.client_overhead.merge(other.client_overhead)
+        self.processed_rows += other.processed_rows
+        self.processed_bytes += other.processed_bytes
+        self.http_requests += other.http_requests
+        self.bytes_received += other.bytes_received
+        return self
+
+    def summary(self, wall_seconds: float) -> dict:
+        return {
+            "elapsedTime": self.elapsed.summary(scale=0.001),
+            "cpuTime": self.cpu.summary(scale=0.001),
+            "queuedTime": self.queued.summary(scale=0.001),
+            "timeToFirstRow": self.time_to_first_row.summary(scale=0.001),
+            "clientOverhead": self.client_overhead.summary(scale=0.001),
+            "processedRows": self.processed_rows,
+            "processedBytes": self.processed_bytes,
+            "httpRequests": self.http_requests,
+            "bytesReceived": self.bytes_received,
+            "rowsPerSecond": round(self.processed_rows / wall_seconds, 3) if wall_seconds else 0,
+            "bytesPerSecond": round(self.processed_bytes / wall_seconds, 3) if wall_seconds else 0,
+        }
+
+
+class RunStats:
+    """
+    Query runner stats grouped per query name and per workload, overall stats are the workloads merged
+    """
+
+    def __init__(self):
+        self.queries = defaultdict(QueriesStats)
+        self.workloads = defaultdict(QueriesStats)
+
+    def add(self, query_data: dict, workload: int = 1) -> None:
+        self.queries[str(query_data["queryName"])].add(query_data)
+        self.workloads[f"workload{workload}"].add(query_data)
+
+    def summary(self, wall_seconds: float) -> dict:
+        overall = QueriesStats()
+        for stats in self.workloads.values():
+            overall.merge(stats)
+        return {
+            "overall": overall.summary(wall_seconds=wall_seconds),
+            "queries": {name: stats.summary(wall_seconds=wall_seconds) for name, stats in self.queries.items()},
+            "workloads": {name: stats.summary(wall_seconds=wall_seconds) for name, stats in self.workloads.items()},
+        }
+
+    @staticmethod
+    def format(name: str, summary: dict) -> str:
+        elapsed, cpu, overhead = summary["elapsedTime"], summary["cpuTime"], summary["clientOverhead"]
+        elapsed_percentiles = " ".join(f"p{pct} {elapsed[f'p{pct}']}" for pct in PERCENTILES)
+        return (f'{name}: {elapsed["count"]} queries, elapsed time {elapsed_percentiles} max {elapsed["max"]} Seconds, '
+                f'cpu time p50 {cpu["p50"]} p99 {cpu["p99"]} max {cpu["max"]} Seconds, '
+                f'client overhead p50 {overhead["p50"]} p99 {overhead["p99"]} Seconds, '
+                f'{summary["rowsPerSecond"]} rows/s, {summary["bytesPerSecond"]} bytes/s')
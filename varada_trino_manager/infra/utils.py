@@ -1,4 +1,10 @@
-from .constants import Paths
+from re import fullmatch
+from hashlib import sha256
+from os import stat
+from threading import Lock
+from typing import BinaryIO
+from collections import defaultdict
+from .constants import Paths, Common
 from json import loads, load
 from logging.config import dictConfig
 from logging import Logger, getLogger
@@ -22,6 +28,80 @@ def session_props_to_dict(properties: str) -> dict:
     }
 
 
+def duration_to_seconds(duration: str) -> int:
+    """
+    Convert a duration such as 90, 90s, 30m, 2h or 1h30m to seconds
+    """
+    match = fullmatch(r"(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s?)?", duration.strip())
+    if not duration.strip() or match is None:
+        raise ValueError(f"Invalid duration: {duration}")
+    hours, minutes, seconds = (int(value) if value else 0 for value in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def sha256_file(file_path: str, length: int = None) -> str:
+    """
+    sha256 hex digest of the file, or of its first length bytes
+    """
+    digest = sha256()
+    remaining = length
+    with open(file_path, "rb") as f:
+        while remaining is None or remaining > 0:
+            size = Common.TRANSFER_CHUNK_SIZE if remaining is None else min(Common.TRANSFER_CHUNK_SIZE, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class FileDigests:
+    """
+    sha256_file memoized by the file's path, size and modification time, so a file sent to every node is hashed once.
+    Concurrent callers asking for the same digest wait for a single computation
+    """
+
+    def __init__(self):
+        self.__digests = {}
+        self.__lock = Lock()
+        self.__key_locks = defaultdict(Lock)
+
+    def get(self, file_path: str, length: int = None) -> str:
+        file_stat = stat(file_path)
+        key = (abspath(file_path), file_stat.st_size, file_stat.st_mtime_ns, length)
+        with self.__lock:
+            key_lock = self.__key_locks[key]
+        with key_lock:
+            digest = self.__digests.get(key)
+            if digest is None:
+                digest = self.__digests[key] = sha256_file(file_path=file_path, length=length)
+        return digest
+
+
+file_digests = FileDigests()
+
+
+class TeeReader:
+    """
+    Binary file object reading from source while writing everything read to sink
+    """
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO):
+        self.__source = source
+        self.__sink = sink
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.__source.read(size)
+        self.__sink.write(data)
+        return data
+
+    def drain(self) -> None:
+        while self.read(Common.TRANSFER_CHUNK_SIZE):
+            pass
+
+
 def init_logger() -> Logger:
     config_path = join(dirname(abspath(__file__)), "logging.json")
     with open(config_path) as f:
@@ -1,11 +1,11 @@
 from .infra.utils import logger
 from click import option, group
-from .commands import commands_groups
+from .commands import LazyGroup
 from logging import INFO, DEBUG, StreamHandler
 
 
 @option("-v", "--verbose", is_flag=True, default=False, help="Be more verbose")
-@group()
+@group(cls=LazyGroup)
 def main(verbose):
     """
     Varada trino manager
@@ -15,8 +15,5 @@ def main(verbose):
             handler.setLevel(DEBUG if verbose else INFO)
 
 
-for command_group in commands_groups:
-    main.add_command(command_group)
-
 if __name__ == "__main__":
     main()